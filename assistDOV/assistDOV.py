@@ -23,13 +23,13 @@ from zaberControl import *
 def toggleFrame(rootTk, frame):
     """Shows/hides a frame based on toggle variable"""
     # set GUI window width and height
-    w = 350
+    w = 520
     if frame.winfo_viewable():
         frame.pack_forget()
-        h = 270
+        h = 500
     else:
         frame.pack(fill="both")
-        h = 400        
+        h = 630        
     # get screen width and height
     #  - 1280x720 for laptop
     ws = rootTk.winfo_screenwidth()
@@ -61,8 +61,8 @@ if __name__ == "__main__":
     ws = root.winfo_screenwidth()
     hs = root.winfo_screenheight()
     # set GUI window width and height
-    w = 350
-    h = 270
+    w = 520
+    h = 500
     # set GUI window location to center of screen
     x = (ws/2) - (w/2)
     y = (hs/2) - (h/2)
@@ -12,20 +12,22 @@ Requirements:
 Author: Dimitri Mojsejenko
 """
 import os
-import subprocess
+import sys
 from datetime import date
 try:
     import win32com.client as win32
 except:
     import pywin32 as win32
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import downloadsFolder
     
 def attachDL():
     """Downloads attachments from Outlook emails received today"""
     outlook = win32.Dispatch("Outlook.Application").GetNamespace("MAPI")
     inbox = outlook.GetDefaultFolder(6) # 6 is the code for the Inbox folder
     # get the path to the user's Downloads folder
-    user = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-    downloads = "C:\\Users\\" + user + "\\Downloads\\" # need to use Windows style path
+    downloads = downloadsFolder() # Windows style path when run in Windows
     # gather all the inbox messages
     messages = inbox.Items
     for message in messages:
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+""" User Paths
+
+This module finds the user's well-known folders (Pictures, Camera Roll, 
+Downloads) shared by all the tools in this repo. The paths are worked out 
+once per process from the environment, instead of asking a shell for the 
+user name every time one is needed.
+
+Any of the paths can be overridden with an environment variable:
+    * RADTOOLS_USER        - the Windows user name
+    * RADTOOLS_PICTURES    - the Pictures folder
+    * RADTOOLS_CAMERA_ROLL - the Camera Roll folder images are saved in
+    * RADTOOLS_DOWNLOADS   - the Downloads folder
+    * RADTOOLS_CACHE       - the folder the tools keep their caches in
+
+On Linux (e.g. WSL) the Windows user name is asked from cmd.exe once, and 
+the Windows user folder under /mnt/c is used when it exists, and the Linux 
+home folder otherwise, so the tools can be tested there.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import getpass
+import subprocess
+from functools import lru_cache
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _folder(*parts):
+    """Joins path parts into a folder path ending in a separator."""
+    return os.path.join(*parts, '')
+
+def _override(name):
+    """Returns the folder given by an environment variable, or None if unset."""
+    path = os.environ.get(name)
+    if path:
+        return _folder(path)
+    return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _windowsUserName():
+    """Returns the Windows user name from cmd.exe when running under WSL, or None if unavailable."""
+    try:
+        result = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    user = result.stdout.decode('utf-8', errors='replace').strip()
+    if not user or user == "%USERNAME%":
+        return None
+    return user
+
+@lru_cache(maxsize=None)
+def userName():
+    """Returns the name of the current user."""
+    for name in ["RADTOOLS_USER", "USERNAME"]:
+        if os.environ.get(name):
+            return os.environ[name]
+    # under WSL only the Linux user is in the environment, so ask Windows once
+    if os.name != "nt":
+        user = _windowsUserName()
+        if user:
+            return user
+    if os.environ.get("USER"):
+        return os.environ["USER"]
+    return getpass.getuser()
+
+@lru_cache(maxsize=None)
+def userHome():
+    """Returns the current user's home folder."""
+    if os.name == "nt":
+        return "C:\\Users\\" + userName() + "\\"
+    windowsHome = _folder("/mnt/c/Users", userName())
+    if os.path.isdir(windowsHome):
+        return windowsHome
+    return _folder(os.path.expanduser("~"))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+@lru_cache(maxsize=None)
+def picturesFolder():
+    """Returns the user's Pictures folder (synced with OneDrive when it is)."""
+    override = _override("RADTOOLS_PICTURES")
+    if override:
+        return override
+    oneDrive = _folder(userHome(), "OneDrive - JNJ", "Pictures")
+    if os.name == "nt" or os.path.isdir(oneDrive):
+        return oneDrive
+    return _folder(userHome(), "Pictures")
+
+@lru_cache(maxsize=None)
+def cameraRollFolder(webcam=True):
+    """Returns the Camera Roll folder captured images are saved in.
+
+    Parameters
+    ~~~~~~~~~~
+    webcam : bool, optional
+        True on a laptop with a webcam, which uses the user's own Camera Roll.
+        Otherwise the lab PC's shared Camera Roll is used.
+
+    """
+    override = _override("RADTOOLS_CAMERA_ROLL")
+    if override:
+        return override
+    if not webcam and os.name == "nt":
+        return "C:\\Users\\User\\Pictures\\Camera Roll\\"
+    return _folder(picturesFolder(), "Camera Roll")
+
+@lru_cache(maxsize=None)
+def downloadsFolder():
+    """Returns the user's Downloads folder."""
+    override = _override("RADTOOLS_DOWNLOADS")
+    if override:
+        return override
+    return _folder(userHome(), "Downloads")
+
+@lru_cache(maxsize=None)
+def cacheFolder():
+    """Returns the folder the tools keep their caches in."""
+    override = _override("RADTOOLS_CACHE")
+    if override:
+        return override
+    return _folder(os.path.expanduser("~"), ".radtools")
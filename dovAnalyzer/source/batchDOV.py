@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+""" DOV Batch Analyzer
+
+This module runs the DOV analysis on every set of DOV analysis CSVs in
+any folder under a root folder, spreading the sets across a pool of worker
+processes. The CSVs are grouped into sets by their names (see dovSets), so
+a folder may hold one trial or a mix of many. Each set's workbook is saved
+as usual (unless turned off), a set that fails or is incomplete is reported
+without stopping the others, and the DOV error of every scope/trial is
+collected into one summary table. Sets whose CSVs haven't changed since
+they were last analyzed are taken from the results index instead of being
+analyzed again.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dovAnalyzer import analyzeDOVset
+from dovIndex import dovIndex, fileSignature
+from dovSets import findDOVsets
+
+SUMMARY_NAME = "dov_summary.csv"
+SUMMARY_FIELDS = ["operator", "scope", "trial", "dovError", "folder", "workbook", "error", "seconds", "unchanged"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _setResult(dov_set, **fields):
+    return dict({"folder": dov_set["folder"], "operator": dov_set["operator"], "scope": dov_set["scope"],
+                 "trial": dov_set["trial"]}, **fields)
+
+def _timedAnalyze(dov_set, workbook=True):
+    """Analyzes one set, returning its result or the error that stopped it, and the time taken."""
+    start = time.perf_counter()
+    try:
+        result = analyzeDOVset(dov_set, workbook)
+        result["error"] = ""
+    except Exception as error:
+        # one bad set shouldn't stop the rest of the batch
+        result = _setResult(dov_set, error="{}: {}".format(type(error).__name__, error))
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def analyzeDOVbatch(root, workers=None, progress=None, workbook=True, index=True, indexPath=None):
+    """Runs the DOV analysis on every set of DOV analysis CSVs under root.
+
+    Parameters
+    ~~~~~~~~~~
+    root : str
+        The folder to search for DOV analysis CSVs.
+    workers : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+        With 1 worker the sets are analyzed in this process.
+    progress : function, optional
+        Called as progress(done, total, result) as each set completes.
+    workbook : bool, optional
+        Whether to save a copy of the DOV calculator Excel doc per set.
+    index : bool, optional
+        Whether to skip sets whose CSVs are unchanged in the results
+        index. Analyzed sets are recorded in the index either way.
+    indexPath : str, optional
+        The results index file; defaults to dovIndex.INDEX_PATH.
+
+    Returns
+    ~~~~~~~
+    results : list
+        A dict per set, sorted by scope and trial, with the folder,
+        operator, scope, trial, DOV error, workbook path, error message
+        (empty if the set was analyzed, or why an incomplete set wasn't),
+        and whether it was unchanged in the index.
+
+    """
+    sets, incomplete, unrecognized = findDOVsets(root)
+    total = len(sets) + len(incomplete)
+    results = []
+
+    def finished(result):
+        results.append(result)
+        if progress is not None:
+            progress(len(results), total, result)
+
+    for dov_set in incomplete:
+        finished(_setResult(dov_set, error="Incomplete set: " + dov_set["problem"], seconds=0.0, unchanged=False))
+    # the index is only used from this process, so workers don't contend for it
+    resultsIndex = dovIndex(indexPath)
+    signatures = [fileSignature(dov_set["csvs"]) for dov_set in sets]
+    toAnalyze = []
+    for i, dov_set in enumerate(sets):
+        indexed = resultsIndex.lookup(dov_set, signatures[i], workbook) if index else None
+        if indexed is None:
+            toAnalyze.append(i)
+        else:
+            finished(dict(indexed, error="", seconds=0.0, unchanged=True))
+
+    def analyzed(i, result):
+        result["unchanged"] = False
+        if not result["error"]:
+            resultsIndex.record(sets[i], signatures[i], result)
+        finished(result)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(toAnalyze)))
+    if workers == 1:
+        for i in toAnalyze:
+            analyzed(i, _timedAnalyze(sets[i], workbook))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_timedAnalyze, sets[i], workbook): i for i in toAnalyze}
+            for future in as_completed(futures):
+                analyzed(futures[future], future.result())
+    resultsIndex.close()
+    results.sort(key=lambda result: (result["scope"], result["trial"], result["operator"], result["folder"]))
+    return results
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def printProgress(done, total, result):
+    """Prints the outcome of each set as it completes."""
+    if result["error"]:
+        outcome = "FAILED " + result["error"]
+    elif result.get("unchanged"):
+        outcome = "DOV error {:.5f} deg (unchanged)".format(result["dovError"])
+    else:
+        outcome = "DOV error {:.5f} deg".format(result["dovError"])
+    print("[{}/{}] {}_{}_{} in {}: {}".format(done, total, result["operator"], result["scope"], result["trial"],
+                                               result["folder"], outcome))
+
+def printSummary(results):
+    """Prints the DOV error of each scope/trial, followed by the sets that failed."""
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ DOV Summary ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    print("{:<15}{:<15}{:<10}{:>20}".format("Operator", "Scope", "Trial", "DOV Error (degrees)"))
+    for result in results:
+        if not result["error"]:
+            print("{:<15}{:<15}{:<10}{:>20.5f}".format(result["operator"], result["scope"], result["trial"], result["dovError"]))
+    failed = [result for result in results if result["error"]]
+    if failed:
+        print("{} set(s) failed:".format(len(failed)))
+        for result in failed:
+            print("  {}_{}_{} in {}: {}".format(result["operator"], result["scope"], result["trial"],
+                                               result["folder"], result["error"]))
+
+def writeSummary(results, path):
+    """Saves the results as a CSV table."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+""" DOV CSV Reader Benchmark
+
+This script compares the time taken to extract the DOV data from Imatest
+DOV analysis CSVs with the csv module reader used by the DOV Analyzer and
+with the full pandas parse it replaced, and checks that both give the same
+values. Give folders or CSVs to time real files; otherwise synthetic CSVs
+are written to a temporary folder (half of them laid out as re-saved by
+Excel).
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import sys
+import glob
+import time
+import tempfile
+import argparse
+import subprocess
+from dovAnalyzer import extractDOVdata, dovCSVs
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def extractDOVdataPandas(csv_path):
+    """The original pandas extraction, kept as the reference."""
+    import pandas as pd
+    # Saving CSVs in Excel changes row indexing by 2, possibly due to header/footer.
+    dovCSV = pd.read_csv(csv_path, names=range(30)) 
+    x_ind = 31
+    y_ind = 32
+    mag_ind = 36
+    # Check if file saved in Excel, which changes y_coord to very long string.
+    y_coord = dovCSV.iloc[y_ind,1]
+    if len(y_coord) > 10:
+        x_ind = x_ind + 2
+        y_ind = y_ind + 2
+        mag_ind = mag_ind + 2
+        y_coord = dovCSV.iloc[y_ind,1]
+    x_coord = dovCSV.iloc[x_ind,1]
+    mag = dovCSV.iloc[mag_ind,2]
+    results = [x_coord, y_coord, mag]
+    return results
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def writeSyntheticCSV(path, x, y, mag, excel=False, extraRows=400):
+    """Writes a CSV laid out like an Imatest DOV analysis, with the data at rows 31/32/36 (+2 if excel)."""
+    rows = [["Imatest DOV analysis", "image.png", "Run date"]] + [["Parameter {}".format(i), str(i * 1.5), "units"] for i in range(1, 40)]
+    rows[31] = ["X offset", str(x), "pixels"]
+    rows[32] = ["Y offset", str(y), "pixels"]
+    rows[36] = ["Magnification", "", str(mag)]
+    if excel:
+        rows[1:1] = [["Saved by Excel", "", ""], ["Saved by Excel", "", ""]]
+        rows[32] = ["Reformatted by Excel", "a long line of text moved up by Excel", ""]
+    # the long tables Imatest writes after the summary
+    rows += [["Row {}".format(i)] + ["{:.4f}".format(i * j / 7) for j in range(1, 25)] for i in range(extraRows)]
+    lines = [','.join(row) for row in rows]
+    lines.insert(3, "") # blank lines are skipped by both readers
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def _timeReader(reader, paths, repeat):
+    """Returns the seconds per file taken by reader, and its results."""
+    results = [reader(path) for path in paths] # warm up
+    start = time.perf_counter()
+    for i in range(repeat):
+        for path in paths:
+            reader(path)
+    return (time.perf_counter() - start) / (repeat * len(paths)), results
+
+def _importSeconds(module):
+    """Returns the time taken to import a module in a fresh interpreter."""
+    code = "import time; s = time.perf_counter(); import {}; print(time.perf_counter() - s)".format(module)
+    try:
+        return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "paths",
+        nargs='*',
+        help="Folders of DOV analysis CSVs, or CSVs, to time (default: synthetic CSVs)"
+    )
+    argParser.add_argument(
+        "-n", "--files",
+        type=int,
+        default=40,
+        help="The number of synthetic CSVs"
+    )
+    argParser.add_argument(
+        "-r", "--repeat",
+        type=int,
+        default=5,
+        help="The number of times to read each CSV"
+    )
+    args = argParser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        paths += dovCSVs(path) if os.path.isdir(path) else glob.glob(path)
+    folder = None
+    if not paths:
+        folder = tempfile.mkdtemp(prefix="benchmarkCSV")
+        for i in range(args.files):
+            path = os.path.join(folder, "DOV_op_scope_35mm_left_T{}_.csv".format(i))
+            writeSyntheticCSV(path, round(i * 0.37 - 5, 3), round(4 - i * 0.21, 3), round(55 + i * 0.01, 3), excel=i % 2 == 1)
+            paths.append(path)
+
+    csvSeconds, csvResults = _timeReader(extractDOVdata, paths, args.repeat)
+    pandasSeconds, pandasResults = _timeReader(extractDOVdataPandas, paths, args.repeat)
+    mismatches = [(path, a, b) for path, a, b in zip(paths, csvResults, pandasResults)
+                  if [str(value) for value in a] != [str(value) for value in b]]
+
+    print("Read {} CSVs {} times each:".format(len(paths), args.repeat))
+    print("  {:<8} {:8.3f} ms per file".format("csv", csvSeconds * 1000))
+    print("  {:<8} {:8.3f} ms per file ({:.1f}x slower)".format("pandas", pandasSeconds * 1000, pandasSeconds / csvSeconds))
+    importSeconds = _importSeconds("pandas")
+    if importSeconds is not None:
+        print("  importing pandas takes {:.3f} s".format(importSeconds))
+    if mismatches:
+        print("{} CSVs gave different values:".format(len(mismatches)))
+        for path, a, b in mismatches:
+            print("  {}: csv {} pandas {}".format(path, a, b))
+    else:
+        print("Both readers gave the same values for every CSV.")
+    if folder:
+        for path in paths:
+            os.remove(path)
+        os.rmdir(folder)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
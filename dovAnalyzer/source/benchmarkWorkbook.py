@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+""" DOV Workbook Benchmark
+
+This script compares the time taken to save filled-in copies of the DOV
+calculator Excel doc with the workbook writer used by the DOV Analyzer,
+which loads the template once, and with loading the template for every
+copy as the DOV Analyzer originally did. It then checks that both give
+every cell of every sheet the same value.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import openpyxl as xl
+from dovWorkbook import SHEET_NAME, fillTemplate
+from dovAnalyzer import DOV_CALC_PATH
+
+DATA_CELLS = ["{}{}".format(column, row) for row in (5, 6) for column in "BCDEFG"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def fillTemplateOriginal(template_path, cells, filename):
+    """The original openpyxl copy, loading the template for each one, kept as the reference."""
+    dovCalc = xl.load_workbook(template_path)
+    dataSheet = dovCalc[SHEET_NAME]
+    for ref, value in cells.items():
+        dataSheet[ref] = value
+    dovCalc.save(filename)
+
+def randomCells(rng):
+    """Returns data cell values like those read from the CSVs, as text."""
+    cells = {}
+    for ref in DATA_CELLS:
+        value = rng.uniform(50, 60) if ref[0] in "DG" else rng.uniform(-20, 20)
+        cells[ref] = str(round(value, 3))
+    return cells
+
+def workbookValues(path):
+    """Returns the value of every cell of every sheet in a workbook."""
+    workbook = xl.load_workbook(path)
+    return {sheet.title: [[cell.value for cell in row] for row in sheet.iter_rows()] for sheet in workbook}
+
+def _timeWriter(writer, template_path, trials, folder, prefix):
+    """Returns the seconds per copy taken by writer, and the copies' paths."""
+    paths = []
+    start = time.perf_counter()
+    for i, cells in enumerate(trials):
+        path = os.path.join(folder, "{}_{}.xlsx".format(prefix, i))
+        writer(template_path, cells, path)
+        paths.append(path)
+    return (time.perf_counter() - start) / len(trials), paths
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "template",
+        nargs='?',
+        default=DOV_CALC_PATH,
+        help="The DOV calculator Excel document (default: scope_dov_calc.xlsx)"
+    )
+    argParser.add_argument(
+        "-n", "--trials",
+        type=int,
+        default=20,
+        help="The number of copies to save with each writer"
+    )
+    args = argParser.parse_args()
+
+    rng = random.Random(0)
+    trials = [randomCells(rng) for i in range(args.trials)]
+    folder = tempfile.mkdtemp(prefix="benchmarkWorkbook")
+    try:
+        newSeconds, newPaths = _timeWriter(fillTemplate, args.template, trials, folder, "new")
+        oldSeconds, oldPaths = _timeWriter(fillTemplateOriginal, args.template, trials, folder, "original")
+        mismatches = [newPath for newPath, oldPath in zip(newPaths, oldPaths)
+                      if workbookValues(newPath) != workbookValues(oldPath)]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print("Saved {} copies of {} with each writer:".format(args.trials, os.path.basename(args.template)))
+    print("  {:<22} {:8.1f} ms per copy (includes loading the template once)".format("template loaded once", newSeconds * 1000))
+    print("  {:<22} {:8.1f} ms per copy ({:.1f}x slower)".format("loaded for each copy", oldSeconds * 1000, oldSeconds / newSeconds))
+    if mismatches:
+        raise SystemExit("{} copies differ from the original writer's.".format(len(mismatches)))
+    print("Both writers gave every cell the same value in every copy.")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
@@ -10,14 +10,20 @@ Author: Dimitri Mojsejenko
 """
 import os
 import sys
+import csv
 import glob
 import argparse
-import subprocess
-import pandas as pd
-import openpyxl as xl
+import multiprocessing
 from tkinter import *
 from tkinter.filedialog import askdirectory
-from math import *
+commonPath = os.path.join(os.path.dirname(__file__), '..', '..', 'common')
+sys.path.append(commonPath)
+from userPaths import downloadsFolder
+from dovCalc import dovErrors
+from dovWorkbook import getWorkbookWriter
+from dovSets import groupDOVsets, printIncomplete
+
+DOV_CALC_PATH = "./scope_dov_calc.xlsx"
 
 class dovAnalyzerGUI(Frame):
     """DOV Analyzer GUI"""
@@ -51,12 +57,8 @@ class dovAnalyzerGUI(Frame):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def _chooseFolder(self, tkEntry):
         """Opens user dialogue asking for file, and stores name of file into given Tkinter entry."""
-        # get the current user profile to start file dialogue at user's Downloads folder
-        user = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-        if os.name == "nt":
-            downloads = "C:\\Users\\" + user + "\\Downloads\\"
-        else:
-            downloads = "/mnt/c/Users/" + user + "Downloads/"
+        # start file dialogue at user's Downloads folder
+        downloads = downloadsFolder()
         fname = askdirectory(initialdir=downloads, title="Select folder", mustexist=True)
         tkEntry.delete(0,END)
         tkEntry.insert(0,fname)
@@ -73,28 +75,62 @@ def extractDOVdata(csv_path):
     Returns
     ~~~~~~~
     results : list
-        A list of the 3 relevant data values, or 'nan' if not found.
+        A list of the 3 relevant data values (as text), or empty string if 
+        not found.
+    
+    Only the rows up to the data are read, with the csv module.
     
     """
     # Saving CSVs in Excel changes row indexing by 2, possibly due to header/footer.
-    dovCSV = pd.read_csv(csv_path, names=range(30)) 
     x_ind = 31
     y_ind = 32
     mag_ind = 36
-    # Check if file saved in Excel, which changes y_coord to very long string.
-    y_coord = dovCSV.iloc[y_ind,1]
+    rows = readCSVrows(csv_path, mag_ind + 2 + 1)
+    # Check if file saved in Excel by which rows hold numbers, trying the usual rows first
+    for offset in (0, 2):
+        x_coord, y_coord, mag = (_cell(rows, x_ind + offset, 1), _cell(rows, y_ind + offset, 1),
+                                 _cell(rows, mag_ind + offset, 2))
+        if all(_isNumber(value) for value in (x_coord, y_coord, mag)):
+            return [x_coord, y_coord, mag]
+    # Neither looks right; fall back to Excel changing y_coord to very long string.
+    y_coord = _cell(rows, y_ind, 1)
     if len(y_coord) > 10:
         x_ind = x_ind + 2
         y_ind = y_ind + 2
         mag_ind = mag_ind + 2
-        y_coord = dovCSV.iloc[y_ind,1]
-    x_coord = dovCSV.iloc[x_ind,1]
-    mag = dovCSV.iloc[mag_ind,2]
+        y_coord = _cell(rows, y_ind, 1)
+    x_coord = _cell(rows, x_ind, 1)
+    mag = _cell(rows, mag_ind, 2)
     results = [x_coord, y_coord, mag]
     return results
 
+def readCSVrows(csv_path, count):
+    """Returns the first count rows of a CSV, skipping blank lines as pandas.read_csv does."""
+    rows = []
+    with open(csv_path, 'r', newline='', encoding='utf-8', errors='replace') as f:
+        for row in csv.reader(f):
+            if not row or (len(row) == 1 and not row[0].strip()):
+                continue
+            rows.append(row)
+            if len(rows) >= count:
+                break # the rest of the file isn't needed
+    return rows
+
+def _cell(rows, row, col):
+    """Returns the text of a cell, or empty string if the CSV doesn't have it."""
+    if row < len(rows) and col < len(rows[row]):
+        return rows[row][col]
+    return ""
+
+def _isNumber(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def calcDOVresults(dov_results, dov_calc_path, filename):
+def calcDOVresults(dov_results, dov_calc_path, filename=None):
     """Given a list of extracted DOV data from all 4 CSVs and path to DOV calculator, save data in DOV calculator Excel doc.
     
     Parameters
@@ -105,59 +141,38 @@ def calcDOVresults(dov_results, dov_calc_path, filename):
     dov_calc_path: str 
         The path to the DOV calculator Excel document.
         
-    filename: str
-        The new name for the copy of the DOV calculator Excel document.
+    filename: str, optional
+        The new name for the copy of the DOV calculator Excel document. If 
+        None, only the DOV error is computed and no copy is saved.
         
     Returns
     ~~~~~~~
-    None : None
-        Data saved in renamed copy of DOV calculator Excel doc in folder of CSVs.
+    finalResult : float
+        The DOV error in degrees. Data saved in renamed copy of DOV calculator 
+        Excel doc in folder of CSVs, by a background thread.
     
     """
-    dovCalc = xl.load_workbook(dov_calc_path)
-    dataSheet = dovCalc["DOV"]
-    left_35, right_35, left_50, right_50 = ([] for i in range(4))
-    # Insert extracted DOV data into the DOV calculator Excel doc
-    for row in dataSheet.iter_rows(min_row=5, max_row=6, min_col=2, max_col=7):
-        resInd = 0
-        for cell in row:
-            if cell.row == 5:
-                if cell.column < 5:
-                    cell.value = dov_results[0][resInd]
-                    left_35.append(dov_results[0][resInd])
-                else:
-                    cell.value = dov_results[1][resInd]
-                    right_35.append(dov_results[1][resInd])
-            else:
-                if cell.column < 5:
-                    cell.value = dov_results[2][resInd]
-                    left_50.append(dov_results[2][resInd])
-                else:
-                    cell.value = dov_results[3][resInd]
-                    right_50.append(dov_results[3][resInd])
-            resInd = (resInd + 1) % 3
-    
-    dovCalc.save(filename)
-    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-    print("File saved: {}".format(filename))
-    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    left_35, right_35, left_50, right_50 = dov_results
+    if filename is not None:
+        # Insert extracted DOV data into a copy of the DOV calculator Excel doc:
+        # B5:D5 left 35mm, E5:G5 right 35mm, B6:D6 left 50mm, E6:G6 right 50mm
+        cells = {}
+        for row, (left, right) in ((5, (left_35, right_35)), (6, (left_50, right_50))):
+            for resInd in range(3):
+                cells["{}{}".format("BCD"[resInd], row)] = left[resInd]
+                cells["{}{}".format("EFG"[resInd], row)] = right[resInd]
+        getWorkbookWriter().submit(dov_calc_path, cells, filename)
+        print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+        print("Saving file: {}".format(filename))
+        print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
     
     # Calculate and print final result
-    B27 = float(left_35[0])*4/float(left_35[2])
-    B28 = float(left_50[0])*4/float(left_50[2])
-    C27 = float(left_35[1])*4/float(left_35[2])
-    C28 = float(left_50[1])*4/float(left_50[2])   
-    E27 = float(right_35[0])*4/float(right_35[2])
-    E28 = float(right_50[0])*4/float(right_50[2])
-    F27 = float(right_35[1])*4/float(right_35[2])
-    F28 = float(right_50[1])*4/float(right_50[2])   
-    B33 = atan((B28-B27+E28-E27)/(50-35))/pi*180
-    C33 = atan((C28-C27+F28-F27)/(50-35)/2)/pi*180
-    finalResult = asin(sqrt(sin(B33/180*pi)**2+sin(C33/180*pi)**2))/pi*180
+    finalResult = dovErrors([left_35, right_35, left_50, right_50])
     print("DOV Error (degrees): {:.5f}\n".format(finalResult))
+    return finalResult
     
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def analyzeDOVdriver(dov_folder):
+def analyzeDOVdriver(dov_folder, workbook=True):
     """Given a folder of DOV analysis CSVs, extract data and run DOV analysis.
     
     Parameters
@@ -165,67 +180,114 @@ def analyzeDOVdriver(dov_folder):
     dov_folder: str
         A folder of DOV analysis CSVs.
         
+    workbook: bool, optional
+        Whether to save a copy of the DOV calculator Excel doc.
+        
     Returns
     ~~~~~~~
-    None : None
-        Data saved in renamed copy of DOV calculator Excel doc in given folder.
+    result : dict or None
+        The result from analyzeDOVfolder, or None if the folder couldn't be 
+        analyzed. Data saved in renamed copy of DOV calculator Excel doc in 
+        given folder.
     
     """
-    dovCalcPath = "./scope_dov_calc.xlsx"
-    results = []
+    try:
+        return analyzeDOVfolder(dov_folder, workbook)
+    except DOVfolderError as error:
+        print(error)
+        return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class DOVfolderError(Exception):
+    """Raised when a folder doesn't hold exactly one complete set of DOV analysis CSVs."""
+
+def dovCSVs(dov_folder):
+    """Returns the Imatest DOV analysis CSVs in a folder, named <test>_<operator>_<scope>_..._<trial>_... ."""
+    return sorted(csv for csv in glob.glob(os.path.join(dov_folder, "*.csv"))
+                  if len(os.path.basename(csv).split('_')) > 5)
+
+def analyzeDOVfolder(dov_folder, workbook=True):
+    """Given a folder of DOV analysis CSVs, extract data and run DOV analysis.
     
-    # Modify path based on OS
-    dov_folder = os.path.abspath(dov_folder)
+    Parameters
+    ~~~~~~~~~~
+    dov_folder: str
+        A folder of DOV analysis CSVs.
+        
+    workbook: bool, optional
+        Whether to save a copy of the DOV calculator Excel doc, or only 
+        compute the DOV error.
+        
+    Returns
+    ~~~~~~~
+    result : dict
+        The result from analyzeDOVset for the folder's set of CSVs.
     
-    # Change path separator based on OS
-    if os.name == "nt": # Windows
-        sep = '\\'
-    else:
-        sep = '/'
-    # last '/' or '\' not included when run with GUI
-    if not dov_folder[-1] == sep:
-        dov_folder = dov_folder + sep
+    Raises
+    ~~~~~~
+    DOVfolderError
+        If the folder doesn't hold exactly one complete set of CSVs.
     
+    """
     # Gather CSVs found in given folder
-    csvList = glob.glob(dov_folder+"*.csv")
+    csvList = dovCSVs(os.path.abspath(dov_folder))
     
     # Check that DOV folder contains proper number of DOV analysis CSV files
-    filesGood = True
-    test, operator, scope, trial = ([] for i in range(4))
-    filenameParts = [test, operator, scope, trial]
+    if len(csvList) < 4:
+        raise DOVfolderError("Only {} CSV files found. Check results folder and retry.".format(len(csvList)))
+    # Group the CSVs by operator, scope, and trial, placing each by its distance and eye
+    sets, incomplete, unrecognized = groupDOVsets(csvList)
+    if not sets:
+        problems = ["{}_{}_{}: {}".format(dovSet["operator"], dovSet["scope"], dovSet["trial"], dovSet["problem"])
+                    for dovSet in incomplete]
+        problems += ["{}: no distance/eye in name".format(os.path.basename(csv)) for csv in unrecognized]
+        raise DOVfolderError("Files contain mismatching metadata ({}). Check files and retry.".format("; ".join(problems)))
+    if len(sets) > 1:
+        raise DOVfolderError("{} DOV sets found in folder. Analyze it in batch mode to analyze them all.".format(len(sets)))
+    printIncomplete(incomplete)
+    return analyzeDOVset(sets[0], workbook)
+
+def analyzeDOVset(dov_set, workbook=True):
+    """Given a complete set of DOV analysis CSVs, extract data and run DOV analysis.
+    
+    Parameters
+    ~~~~~~~~~~
+    dov_set: dict
+        A set from groupDOVsets, with its folder, operator, scope, trial, 
+        and 4 CSVs in the order of DOV_SLOTS.
+        
+    workbook: bool, optional
+        Whether to save a copy of the DOV calculator Excel doc, or only 
+        compute the DOV error.
+        
+    Returns
+    ~~~~~~~
+    result : dict
+        The folder, operator, scope, trial, DOV error (degrees) and path of 
+        the saved copy of the DOV calculator Excel doc (empty if not saved).
+    
+    """
+    dovCalcPath = DOV_CALC_PATH
+    results = []
     print("The following CSVs were found:")
-    for csv in csvList:
+    for csv in dov_set["csvs"]:
         print(csv)
-        # Gather file metadata
-        fileSplit = csv.split(sep)
-        fileLoc = sep.join(fileSplit[:-1])
-        filename = fileSplit[-1].split('_')
-        test.append(filename[0])
-        operator.append(filename[1])
-        scope.append(filename[2])
-        trial.append(filename[5])
-        
-    # Check that each file has the same test, operator, scope, and trial
-    for part in filenameParts:
-        if not [part[0]]*len(part) == part:
-            filesGood = False
 
     # Assemble new filename
-    newFileName = fileLoc+sep+"scope_dov_calc_"+operator[0]+'_'+scope[0]+'_'+trial[0]+".xlsx"
+    newFileName = os.path.join(dov_set["folder"], "scope_dov_calc_{}_{}_{}.xlsx".format(
+        dov_set["operator"], dov_set["scope"], dov_set["trial"]))
 
-    if len(csvList) < 4:
-        print("Only {} CSV files found. Check results folder and retry.".format(len(csvList)))
-    else:
-        if filesGood:
-            for csv in csvList:
-                results.append(extractDOVdata(csv))
-            if results:
-                print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-                print("Extracted results:")
-                print(results)
-            calcDOVresults(results, dovCalcPath, newFileName)
-        else:
-            print("Files contain mismatching metadata. Check files and retry.")
+    for csv in dov_set["csvs"]:
+        results.append(extractDOVdata(csv))
+    if results:
+        print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+        print("Extracted results:")
+        print(results)
+    if not workbook:
+        newFileName = ""
+    dovError = calcDOVresults(results, dovCalcPath, newFileName or None)
+    return {"folder": dov_set["folder"], "operator": dov_set["operator"], "scope": dov_set["scope"],
+            "trial": dov_set["trial"], "dovError": dovError, "workbook": newFileName}
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def main():
@@ -236,13 +298,57 @@ def main():
         type=str,
         help="The path to the folder of CSVs to extract data from"
     )
+    argParser.add_argument(
+        "-b", "--batch",
+        action="store_true",
+        help="Analyze every set of DOV CSVs in any folder under the given path and summarize the results"
+    )
+    argParser.add_argument(
+        "-j", "--workers",
+        type=int,
+        help="The number of folders to analyze at once in batch mode (default: number of CPUs)"
+    )
+    argParser.add_argument(
+        "--no-workbook",
+        action="store_true",
+        help="Only compute the DOV error, without saving a copy of the DOV calculator Excel doc"
+    )
+    argParser.add_argument(
+        "--reanalyze",
+        action="store_true",
+        help="In batch mode, analyze every folder again, even if its CSVs are unchanged in the results index"
+    )
+    argParser.add_argument(
+        "--history",
+        type=str,
+        metavar="SCOPE",
+        help="Print the DOV error history of a scope from the results index"
+    )
+    argParser.add_argument(
+        "--index",
+        type=str,
+        help="The results index file (default: dovIndex.sqlite in the tools' cache folder)"
+    )
     args = argParser.parse_args()
 
     # check if intended as stand-alone command or interactive GUI (no args)
-    if args.DOVresultsPath:
+    if args.history:
+        from dovIndex import dovIndex, printHistory
+        resultsIndex = dovIndex(args.index)
+        printHistory(resultsIndex.history(args.history), args.history)
+        resultsIndex.close()
+    elif args.DOVresultsPath:
         # check that the given path is a directory
-        if os.path.isdir(args.DOVresultsPath):
-            analyzeDOVdriver(args.DOVresultsPath)
+        if os.path.isdir(args.DOVresultsPath) and args.batch:
+            from batchDOV import analyzeDOVbatch, printProgress, printSummary, writeSummary, SUMMARY_NAME # batchDOV imports this module
+            results = analyzeDOVbatch(args.DOVresultsPath, args.workers, printProgress, not args.no_workbook,
+                                      not args.reanalyze, args.index)
+            printSummary(results)
+            summaryPath = os.path.join(args.DOVresultsPath, SUMMARY_NAME)
+            writeSummary(results, summaryPath)
+            print("Summary saved: {}".format(summaryPath))
+        elif os.path.isdir(args.DOVresultsPath):
+            analyzeDOVdriver(args.DOVresultsPath, not args.no_workbook)
         else:
             print("The given path is not a directory. Retry with a folder of DOV results CSVs.")             
     else:
@@ -267,4 +373,5 @@ def main():
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # for worker processes in the Windows executable
     main()
\ No newline at end of file
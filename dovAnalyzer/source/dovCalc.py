@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+""" DOV Calculator
+
+This module computes the DOV error with NumPy, for any number of trials at
+once, from the (x, y, magnification) values extracted from each trial's 4
+DOV analysis CSVs. It gives the same result as the DOV calculator Excel
+doc without needing it, so historical data can be re-analyzed in bulk.
+
+Run as a script to check the vectorized calculation against the scalar
+formula on random trials and time both.
+
+Author: Dimitri Mojsejenko
+"""
+import time
+import argparse
+import numpy as np
+from math import *
+
+# the distances (mm) the DOV images are taken at
+NEAR = 35
+FAR = 50
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def dovErrors(trials):
+    """Returns the DOV error (degrees) of each trial.
+
+    Parameters
+    ~~~~~~~~~~
+    trials : array_like
+        The extracted DOV data, shaped (trials, 4, 3): for each trial the
+        left 35mm, right 35mm, left 50mm and right 50mm CSVs (the order of
+        extractDOVdata's results), each as (x, y, magnification). A single
+        trial shaped (4, 3) is also accepted.
+
+    Returns
+    ~~~~~~~
+    errors : numpy.ndarray or float
+        The DOV error of each trial, or NaN where it can't be computed.
+
+    """
+    data = np.asarray(trials, dtype=np.float64)
+    single = data.ndim == 2
+    if single:
+        data = data[np.newaxis]
+    # scaled offsets, as in cells B27:C28 (left eye) and E27:F28 (right eye)
+    offsets = data[:, :, :2] * 4 / data[:, :, 2:3]
+    left35, right35, left50, right50 = offsets[:, 0], offsets[:, 1], offsets[:, 2], offsets[:, 3]
+    drift = left50 - left35 + right50 - right35
+    B33 = np.arctan(drift[:, 0] / (FAR - NEAR))
+    C33 = np.arctan(drift[:, 1] / (FAR - NEAR) / 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        errors = np.degrees(np.arcsin(np.sqrt(np.sin(B33)**2 + np.sin(C33)**2)))
+    return float(errors[0]) if single else errors
+
+def dovErrorScalar(dov_results):
+    """Returns the DOV error (degrees) of one trial, as computed by the DOV calculator Excel doc.
+
+    Parameters
+    ~~~~~~~~~~
+    dov_results : list
+        The results of extractDOVdata for the left 35mm, right 35mm, left
+        50mm and right 50mm CSVs.
+
+    """
+    left_35, right_35, left_50, right_50 = dov_results
+    B27 = float(left_35[0])*4/float(left_35[2])
+    B28 = float(left_50[0])*4/float(left_50[2])
+    C27 = float(left_35[1])*4/float(left_35[2])
+    C28 = float(left_50[1])*4/float(left_50[2])
+    E27 = float(right_35[0])*4/float(right_35[2])
+    E28 = float(right_50[0])*4/float(right_50[2])
+    F27 = float(right_35[1])*4/float(right_35[2])
+    F28 = float(right_50[1])*4/float(right_50[2])
+    B33 = atan((B28-B27+E28-E27)/(50-35))/pi*180
+    C33 = atan((C28-C27+F28-F27)/(50-35)/2)/pi*180
+    return asin(sqrt(sin(B33/180*pi)**2+sin(C33/180*pi)**2))/pi*180
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def randomTrials(count, seed=0):
+    """Returns count random trials shaped (count, 4, 3) with offsets and magnifications like real ones."""
+    rng = np.random.default_rng(seed)
+    trials = np.empty((count, 4, 3))
+    trials[:, :, :2] = rng.uniform(-20, 20, size=(count, 4, 2))
+    trials[:, :, 2] = rng.uniform(50, 60, size=(count, 4))
+    return trials
+
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-n", "--trials",
+        type=int,
+        default=100000,
+        help="The number of random trials to check"
+    )
+    args = argParser.parse_args()
+
+    trials = randomTrials(args.trials)
+    start = time.perf_counter()
+    errors = dovErrors(trials)
+    vectorSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = np.array([dovErrorScalar(trial.tolist()) for trial in trials])
+    scalarSeconds = time.perf_counter() - start
+    difference = np.max(np.abs(errors - expected))
+    print("{} trials: vectorized {:.2f} ms, scalar {:.2f} ms ({:.0f}x faster)".format(
+        args.trials, vectorSeconds * 1000, scalarSeconds * 1000, scalarSeconds / vectorSeconds))
+    print("Largest difference from the scalar formula: {:.3g} degrees".format(difference))
+    if not difference < 1e-9:
+        raise SystemExit("Vectorized DOV error doesn't match the scalar formula.")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+""" DOV Results Index
+
+This module keeps a SQLite index of the DOV result sets that have been
+analyzed: each set's DOV error and workbook, along with the path, size
+and modification time of each of its CSVs. Batch runs look sets up in
+the index and only analyze the ones that are new or whose CSVs changed,
+and the DOV error history of a scope is answered from the index without
+reopening any workbooks.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+commonPath = os.path.join(os.path.dirname(__file__), '..', '..', 'common')
+sys.path.append(commonPath)
+from userPaths import cacheFolder
+
+INDEX_PATH = os.path.join(cacheFolder(), "dovIndex.sqlite")
+HISTORY_FIELDS = ["operator", "scope", "trial", "dovError", "analyzed", "folder", "workbook"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def fileSignature(csvList):
+    """Returns the path, size and modification time of each CSV, as stored in the index."""
+    signature = []
+    for path in sorted(csvList):
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return json.dumps(signature)
+
+def setKey(dov_set):
+    """Returns the key of a set of CSVs from groupDOVsets in the index: its folder, operator, scope and trial."""
+    return "|".join([os.path.normcase(os.path.abspath(dov_set["folder"])),
+                     dov_set["operator"], dov_set["scope"], dov_set["trial"]])
+
+def trialKey(trial):
+    """Sorts trials naturally, so T2 comes before T10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', trial or "")]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class dovIndex:
+    """Connection to a DOV results index, creating it if needed.
+
+    Parameters
+    ~~~~~~~~~~
+    path : str, optional
+        The index file; defaults to INDEX_PATH in the tools' cache folder.
+
+    """
+    def __init__(self, path=None):
+        self.path = path or INDEX_PATH
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sets (setKey TEXT PRIMARY KEY, files TEXT, operator TEXT, "
+                         "scope TEXT, trial TEXT, dovError REAL, workbook TEXT, analyzed REAL, resultFolder TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scopeIndex ON sets (scope)")
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def lookup(self, dov_set, files, workbook=True):
+        """Returns the indexed result of a set of CSVs, or None if they changed since it was analyzed.
+
+        Parameters
+        ~~~~~~~~~~
+        dov_set : dict
+            The set of DOV analysis CSVs, from groupDOVsets.
+        files : str
+            The set's CSVs, from fileSignature.
+        workbook : bool, optional
+            Whether the set's workbook is wanted; if so, a result without
+            a saved workbook isn't used.
+
+        """
+        row = self._db.execute("SELECT files, operator, scope, trial, dovError, workbook, resultFolder "
+                               "FROM sets WHERE setKey = ?", (setKey(dov_set),)).fetchone()
+        if row is None or row[0] != files:
+            return None
+        result = {"folder": row[6], "operator": row[1], "scope": row[2], "trial": row[3],
+                  "dovError": float('nan') if row[4] is None else row[4], "workbook": row[5]}
+        if workbook and not (result["workbook"] and os.path.exists(result["workbook"])):
+            return None
+        return result
+
+    def record(self, dov_set, files, result):
+        """Stores the result of analyzing a set of CSVs, replacing any earlier result."""
+        self._db.execute("INSERT OR REPLACE INTO sets (setKey, files, operator, scope, trial, dovError, workbook, "
+                         "analyzed, resultFolder) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (setKey(dov_set), files, result["operator"], result["scope"], result["trial"],
+                          result["dovError"], result["workbook"], time.time(), result["folder"]))
+        self._db.commit()
+
+    def history(self, scope=None, operator=None):
+        """Returns the indexed results of a scope (or every scope) and operator, if given, sorted by trial.
+
+        Returns
+        ~~~~~~~
+        results : list
+            A dict per result set with the fields in HISTORY_FIELDS; analyzed
+            is when it was last analyzed, as a time.time() value.
+
+        """
+        query = "SELECT operator, scope, trial, dovError, analyzed, resultFolder, workbook FROM sets"
+        conditions, params = [], []
+        if scope is not None:
+            conditions.append("scope = ?")
+            params.append(scope)
+        if operator is not None:
+            conditions.append("operator = ?")
+            params.append(operator)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        results = [dict(zip(HISTORY_FIELDS, row)) for row in self._db.execute(query, params)]
+        results.sort(key=lambda result: (result["scope"], trialKey(result["trial"]), result["operator"], result["analyzed"]))
+        return results
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def printHistory(results, scope):
+    """Prints the DOV error history of a scope."""
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ DOV History: {} ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~".format(scope))
+    if not results:
+        print("No results indexed for scope {}.".format(scope))
+        return
+    print("{:<15}{:<10}{:>20}{:>22}  {}".format("Operator", "Trial", "DOV Error (degrees)", "Analyzed", "Folder"))
+    for result in results:
+        analyzed = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(result["analyzed"]))
+        dovError = "nan" if result["dovError"] is None else "{:.5f}".format(result["dovError"])
+        print("{:<15}{:<10}{:>20}{:>22}  {}".format(result["operator"], result["trial"], dovError,
+                                                    analyzed, result["folder"]))
@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+""" DOV Trend Report
+
+This script reviews accumulated DOV results, from the results index or
+from batch summary CSVs, without opening any workbooks. For each scope the
+trials are put in order and an individuals and moving range (I-MR) control
+chart is computed: the mean, spread, and control limits of the DOV error,
+with the trials outside the limits flagged. The statistics for every scope
+are computed together with NumPy, and the report is saved as one HTML page
+with a table and a chart per scope.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import csv
+import html
+import time
+import argparse
+import numpy as np
+from dovIndex import dovIndex, trialKey
+
+REPORT_NAME = "dov_report.html"
+# I-MR chart constants for moving ranges of 2 trials
+E2 = 2.66
+D4 = 3.267
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def readSummary(path):
+    """Returns the analyzed results in a batch summary CSV (see batchDOV.writeSummary)."""
+    results = []
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get("error") or not row.get("dovError"):
+                continue
+            results.append({"operator": row["operator"], "scope": row["scope"], "trial": row["trial"],
+                            "dovError": float(row["dovError"]), "folder": row["folder"]})
+    return results
+
+def _ordered(results):
+    """Returns the results with a DOV error, sorted by scope and trial."""
+    results = [result for result in results
+               if result["dovError"] is not None and np.isfinite(result["dovError"])]
+    results.sort(key=lambda result: (result["scope"], trialKey(result["trial"]), result["operator"]))
+    return results
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def controlCharts(scopes, errors):
+    """Computes the I-MR control chart of every scope at once.
+
+    Parameters
+    ~~~~~~~~~~
+    scopes : array_like
+        The scope of each trial, with each scope's trials together and in order.
+    errors : array_like
+        The DOV error (degrees) of each trial.
+
+    Returns
+    ~~~~~~~
+    stats : dict
+        Arrays with one value per scope (in order of first appearance):
+        scope, trials, mean, std, min, max, mrBar (average moving range),
+        lcl, ucl and mrUcl (the control limits, NaN with fewer than 2
+        trials).
+    flags : dict
+        Arrays with one value per trial: index (of its scope in stats),
+        movingRange (NaN for a scope's first trial), beyond (outside the
+        control limits) and jump (moving range above its limit).
+
+    """
+    scopes = np.asarray(scopes)
+    errors = np.asarray(errors, dtype=np.float64)
+    first = np.flatnonzero(np.r_[True, scopes[1:] != scopes[:-1]]) if len(scopes) else np.array([], dtype=int)
+    counts = np.diff(np.r_[first, len(scopes)])
+    index = np.repeat(np.arange(len(first)), counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(errors, first) / counts if len(first) else np.array([])
+        deviations = (errors - mean[index]) ** 2
+        std = np.sqrt(np.add.reduceat(deviations, first) / (counts - 1)) if len(first) else np.array([])
+        # moving ranges between consecutive trials of the same scope
+        movingRange = np.full(len(errors), np.nan)
+        same = index[1:] == index[:-1]
+        movingRange[1:][same] = np.abs(np.diff(errors))[same]
+        ranged = ~np.isnan(movingRange)
+        mrBar = (np.bincount(index[ranged], weights=movingRange[ranged], minlength=len(first)) /
+                 np.bincount(index[ranged], minlength=len(first)))
+    ucl = mean + E2 * mrBar
+    lcl = np.maximum(mean - E2 * mrBar, 0) # the DOV error can't be negative
+    mrUcl = D4 * mrBar
+    stats = {
+        "scope": scopes[first],
+        "trials": counts,
+        "mean": mean,
+        "std": std,
+        "min": np.minimum.reduceat(errors, first) if len(first) else np.array([]),
+        "max": np.maximum.reduceat(errors, first) if len(first) else np.array([]),
+        "mrBar": mrBar,
+        "lcl": lcl,
+        "ucl": ucl,
+        "mrUcl": mrUcl,
+    }
+    flags = {
+        "index": index,
+        "movingRange": movingRange,
+        "beyond": (errors > ucl[index]) | (errors < lcl[index]),
+        "jump": movingRange > mrUcl[index],
+    }
+    return stats, flags
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _number(value, digits=4):
+    return "&ndash;" if not np.isfinite(value) else "{:.{}f}".format(value, digits)
+
+def _svgChart(labels, values, flagged, mean, lcl, ucl, width=720, height=240):
+    """Returns an SVG individuals chart of a scope's trials with its center line and control limits."""
+    left, right, top, bottom = 50, 15, 15, 45
+    lines = [value for value in (mean, lcl, ucl) if np.isfinite(value)]
+    low = min(np.min(values), *lines) if lines else np.min(values)
+    high = max(np.max(values), *lines) if lines else np.max(values)
+    pad = (high - low) * 0.1 or 0.5
+    low, high = max(low - pad, 0), high + pad
+    xs = left + (np.arange(len(values)) + 0.5) * (width - left - right) / len(values)
+    ys = top + (high - values) / (high - low) * (height - top - bottom)
+
+    def y(value):
+        return top + (high - value) / (high - low) * (height - top - bottom)
+
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" font-family="sans-serif" font-size="11">'.format(width, height),
+           '<rect x="{}" y="{}" width="{}" height="{}" fill="none" stroke="#999"/>'.format(left, top, width - left - right, height - top - bottom)]
+    for value in np.linspace(low, high, 5):
+        svg.append('<text x="{}" y="{:.1f}" text-anchor="end">{:.2f}</text>'.format(left - 4, y(value) + 4, value))
+    for value, colour, dash, name in ((mean, "#2a7", "", "mean"), (ucl, "#c33", "5,4", "UCL"), (lcl, "#c33", "5,4", "LCL")):
+        if np.isfinite(value):
+            svg.append('<line x1="{}" x2="{}" y1="{:.1f}" y2="{:.1f}" stroke="{}" stroke-dasharray="{}"/>'.format(
+                left, width - right, y(value), y(value), colour, dash))
+            svg.append('<text x="{}" y="{:.1f}" fill="{}" text-anchor="end">{}</text>'.format(width - right - 2, y(value) - 3, colour, name))
+    svg.append('<polyline fill="none" stroke="#36c" points="{}"/>'.format(
+        " ".join("{:.1f},{:.1f}".format(x, v) for x, v in zip(xs, ys))))
+    step = max(1, len(values) // 20) # keep the trial labels readable on long lots
+    for i, (x, v) in enumerate(zip(xs, ys)):
+        svg.append('<circle cx="{:.1f}" cy="{:.1f}" r="{}" fill="{}"><title>{}: {:.4f}</title></circle>'.format(
+            x, v, 4 if flagged[i] else 3, "#c33" if flagged[i] else "#36c", html.escape(labels[i]), values[i]))
+        if i % step == 0:
+            svg.append('<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(x, height - bottom + 15, html.escape(labels[i])))
+    svg.append('</svg>')
+    return "\n".join(svg)
+
+def writeReport(results, stats, flags, path):
+    """Saves the per-scope table and control charts as an HTML page."""
+    errors = np.array([result["dovError"] for result in results])
+    out = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>DOV Trend Report</title>',
+           '<style>body{font-family:sans-serif;margin:20px} table{border-collapse:collapse} '
+           'td,th{border:1px solid #ccc;padding:3px 8px;text-align:right} th{background:#eee} '
+           '.flag{color:#c33;font-weight:bold}</style></head><body>',
+           '<h1>DOV Trend Report</h1>',
+           '<p>{} trials of {} scopes, generated {}. Control limits are from an I-MR chart of each scope\'s '
+           'trials in order: mean &plusmn; {} &times; the average moving range.</p>'.format(
+               len(results), len(stats["scope"]), time.strftime("%Y-%m-%d %H:%M:%S"), E2),
+           '<table><tr><th>Scope</th><th>Trials</th><th>Mean</th><th>Std dev</th><th>Min</th><th>Max</th>'
+           '<th>LCL</th><th>UCL</th><th>Out of control</th></tr>']
+    outOfControl = np.bincount(flags["index"], weights=flags["beyond"] | flags["jump"], minlength=len(stats["scope"]))
+    for s, scope in enumerate(stats["scope"]):
+        out.append('<tr><td><a href="#scope-{0}">{0}</a></td><td>{1}</td><td>{2}</td><td>{3}</td><td>{4}</td><td>{5}</td>'
+                   '<td>{6}</td><td>{7}</td><td{8}>{9:d}</td></tr>'.format(
+                       html.escape(scope), stats["trials"][s], _number(stats["mean"][s]), _number(stats["std"][s]),
+                       _number(stats["min"][s]), _number(stats["max"][s]), _number(stats["lcl"][s]),
+                       _number(stats["ucl"][s]), ' class="flag"' if outOfControl[s] else "", int(outOfControl[s])))
+    out.append('</table>')
+    for s, scope in enumerate(stats["scope"]):
+        members = np.flatnonzero(flags["index"] == s)
+        labels = ["{} {}".format(results[i]["trial"], results[i]["operator"]) for i in members]
+        flagged = flags["beyond"][members] | flags["jump"][members]
+        out.append('<h2 id="scope-{0}">Scope {0}</h2>'.format(html.escape(scope)))
+        out.append(_svgChart(labels, errors[members], flagged, stats["mean"][s], stats["lcl"][s], stats["ucl"][s]))
+        if flagged.any():
+            out.append('<p class="flag">Out of control:</p><ul>')
+            for i in members[flagged]:
+                reasons = []
+                if flags["beyond"][i]:
+                    reasons.append("outside the control limits")
+                if flags["jump"][i]:
+                    reasons.append("moving range {:.4f} above its limit {:.4f}".format(flags["movingRange"][i], stats["mrUcl"][s]))
+                out.append('<li>{} ({}, {}): {:.4f} deg, {}</li>'.format(
+                    html.escape(results[i]["trial"]), html.escape(results[i]["operator"]),
+                    html.escape(results[i]["folder"] or ""), errors[i], " and ".join(reasons)))
+            out.append('</ul>')
+    out.append('</body></html>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(out))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def printReport(results, stats, flags):
+    """Prints the per-scope statistics and the trials that are out of control."""
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ DOV Trend Report ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    print("{:<15}{:>7}{:>10}{:>10}{:>10}{:>10}{:>10}".format("Scope", "Trials", "Mean", "Std dev", "LCL", "UCL", "Flagged"))
+    outOfControl = np.bincount(flags["index"], weights=flags["beyond"] | flags["jump"], minlength=len(stats["scope"]))
+    for s, scope in enumerate(stats["scope"]):
+        print("{:<15}{:>7}{:>10.4f}{:>10.4f}{:>10.4f}{:>10.4f}{:>10d}".format(
+            scope, stats["trials"][s], stats["mean"][s], stats["std"][s], stats["lcl"][s], stats["ucl"][s], int(outOfControl[s])))
+    for i in np.flatnonzero(flags["beyond"] | flags["jump"]):
+        print("Out of control: scope {} trial {} ({}): {:.4f} deg".format(
+            results[i]["scope"], results[i]["trial"], results[i]["operator"], results[i]["dovError"]))
+
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-s", "--summary",
+        nargs='+',
+        help="Batch summary CSVs to report on, instead of the results index"
+    )
+    argParser.add_argument(
+        "--index",
+        type=str,
+        help="The results index file (default: dovIndex.sqlite in the tools' cache folder)"
+    )
+    argParser.add_argument(
+        "--scope",
+        nargs='+',
+        help="Only report on these scopes"
+    )
+    argParser.add_argument(
+        "-o", "--output",
+        type=str,
+        default=REPORT_NAME,
+        help="The HTML report to write"
+    )
+    args = argParser.parse_args()
+
+    start = time.perf_counter()
+    if args.summary:
+        results = [result for path in args.summary for result in readSummary(path)]
+    else:
+        resultsIndex = dovIndex(args.index)
+        results = resultsIndex.history()
+        resultsIndex.close()
+    if args.scope:
+        results = [result for result in results if result["scope"] in args.scope]
+    results = _ordered(results)
+    if not results:
+        print("No DOV results to report on.")
+        return
+    stats, flags = controlCharts([result["scope"] for result in results], [result["dovError"] for result in results])
+    printReport(results, stats, flags)
+    writeReport(results, stats, flags, args.output)
+    print("Report saved: {} ({:.2f} s)".format(args.output, time.perf_counter() - start))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
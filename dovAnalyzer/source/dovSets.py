@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+""" DOV CSV Sets
+
+This module sorts Imatest DOV analysis CSVs into the 4-file sets the DOV
+calculator needs, from their names alone. The CSVs are named after the
+images imageCaptureDOV saves, <scope>_dov_<distance>_trial<N>_<eye>, with
+the test and operator in front:
+    <test>_<operator>_<scope>_dov_<distance>_trial<N>_<eye>... .csv
+e.g. DOV_amy_S2_dov_35mm_trial1_left.csv. The CSVs of a folder are grouped
+by (operator, scope, trial), and each CSV is placed by the distance (35mm
+or 50mm) and eye (left or right) found anywhere in its name rather than by
+its position in the folder listing, so one folder can hold any number of
+trials. Sets missing a CSV, or with two CSVs for the same image, are
+reported instead of analyzed.
+
+Run this module as a script to check that names made the way
+imageCaptureDOV makes them are grouped into their sets.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import argparse
+from dovCalc import NEAR, FAR
+
+# the CSVs of a set, in the order calcDOVresults takes them
+DOV_SLOTS = [("{}mm".format(NEAR), "left"), ("{}mm".format(NEAR), "right"),
+             ("{}mm".format(FAR), "left"), ("{}mm".format(FAR), "right")]
+DISTANCES = {distance for distance, eye in DOV_SLOTS}
+EYES = {eye for distance, eye in DOV_SLOTS}
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def parseDOVname(csv_path):
+    """Returns the test, operator, scope, distance, eye and trial in a DOV CSV's name, or None if it isn't one.
+
+    The test, operator, scope and trial are read from their places in the
+    name, as the original analyzer did; the distance and eye can be
+    anywhere in it, but must each appear exactly once.
+
+    """
+    name = os.path.basename(csv_path)
+    if not name.lower().endswith(".csv"):
+        return None
+    parts = name[:-4].split('_')
+    if len(parts) < 6:
+        return None
+    tokens = [part.lower() for part in parts]
+    distances = [token for token in tokens if token in DISTANCES]
+    eyes = [token for token in tokens if token in EYES]
+    if len(distances) != 1 or len(eyes) != 1:
+        return None
+    return {"test": parts[0], "operator": parts[1], "scope": parts[2],
+            "distance": distances[0], "eye": eyes[0], "trial": parts[5]}
+
+def groupDOVsets(csvList):
+    """Groups DOV CSVs into complete sets by folder, operator, scope and trial.
+
+    Parameters
+    ~~~~~~~~~~
+    csvList : list
+        The paths of the CSVs, in any order and from any number of folders.
+
+    Returns
+    ~~~~~~~
+    sets : list
+        A dict per complete set with its folder, operator, scope, trial, and
+        csvs: its 4 CSVs in the order of DOV_SLOTS.
+    incomplete : list
+        A dict per set that can't be analyzed, like those in sets but with
+        csvs holding None for each missing CSV, and a problem message.
+    unrecognized : list
+        The CSVs whose names don't give a distance and eye.
+
+    """
+    groups = {}
+    unrecognized = []
+    for csv_path in csvList:
+        parsed = parseDOVname(csv_path)
+        if parsed is None:
+            unrecognized.append(csv_path)
+            continue
+        key = (os.path.dirname(os.path.abspath(csv_path)), parsed["operator"], parsed["scope"], parsed["trial"])
+        group = groups.setdefault(key, {slot: [] for slot in DOV_SLOTS})
+        group[(parsed["distance"], parsed["eye"])].append(csv_path)
+
+    sets, incomplete = [], []
+    for (folder, operator, scope, trial), group in sorted(groups.items()):
+        dovSet = {"folder": folder, "operator": operator, "scope": scope, "trial": trial,
+                  "csvs": [sorted(group[slot])[0] if group[slot] else None for slot in DOV_SLOTS]}
+        missing = [" ".join(slot) for slot in DOV_SLOTS if not group[slot]]
+        duplicated = [" ".join(slot) for slot in DOV_SLOTS if len(group[slot]) > 1]
+        if missing:
+            incomplete.append(dict(dovSet, problem="Missing CSV for {}".format(", ".join(missing))))
+        elif duplicated:
+            incomplete.append(dict(dovSet, problem="More than one CSV for {}".format(", ".join(duplicated))))
+        else:
+            sets.append(dovSet)
+    return sets, incomplete, unrecognized
+
+def findDOVsets(root):
+    """Returns the complete, incomplete and unrecognized DOV CSVs in every folder under root (including root)."""
+    csvList = []
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        csvList.extend(os.path.join(folder, name) for name in files if name.lower().endswith(".csv"))
+    return groupDOVsets(csvList)
+
+def printIncomplete(incomplete):
+    """Prints the sets that can't be analyzed and why."""
+    for dovSet in incomplete:
+        print("Incomplete set {}_{}_{} in {}: {}".format(dovSet["operator"], dovSet["scope"], dovSet["trial"],
+                                                         dovSet["folder"], dovSet["problem"]))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def captureName(test, operator, scope, distance, trial, eye):
+    """Returns the CSV name of an image saved by imageCaptureDOV.capImageDOV, with the test and operator in front."""
+    return "{}_{}_{}_dov_{}_trial{}_{}.csv".format(test, operator, scope, distance, trial, eye)
+
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-n", "--trials",
+        type=int,
+        default=3,
+        help="The number of trials per scope to check"
+    )
+    args = argParser.parse_args()
+
+    expected = {}
+    csvList = []
+    for operator, scope in (("amy", "S2"), ("bob", "S10")):
+        for trial in range(1, args.trials + 1):
+            csvs = [os.path.abspath(captureName("DOV", operator, scope, distance, trial, eye)) for distance, eye in DOV_SLOTS]
+            expected[(operator, scope, "trial{}".format(trial))] = csvs
+            csvList += csvs
+    # the folder listing order shouldn't matter
+    sets, incomplete, unrecognized = groupDOVsets(sorted(csvList, reverse=True))
+    found = {(dovSet["operator"], dovSet["scope"], dovSet["trial"]): dovSet["csvs"] for dovSet in sets}
+    print("{} CSVs grouped into {} sets ({} expected), {} incomplete, {} unrecognized".format(
+        len(csvList), len(sets), len(expected), len(incomplete), len(unrecognized)))
+    if found != expected or incomplete or unrecognized:
+        raise SystemExit("Captured DOV names weren't grouped into their sets.")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
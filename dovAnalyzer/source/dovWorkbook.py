@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+""" DOV Workbook Writer
+
+This module saves filled-in copies of the DOV calculator Excel doc with
+openpyxl. The template is loaded once per process and kept in memory; each
+copy only sets the DOV sheet's data cells (B5:G6) in that workbook, saves
+it, and puts the template's values back, instead of loading the whole
+workbook again for every trial. Formula results are left for Excel to
+recalculate when the copy is opened. benchmarkWorkbook.py compares this
+with loading the template for each copy, and checks both save the same
+cells.
+
+Copies are filled in and saved by a background thread, so the next trial
+can be analyzed while the last one is saved. Queued saves are finished
+before the program (or a batch worker process) exits.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import math
+import queue
+import atexit
+import threading
+import multiprocessing.util
+import openpyxl as xl
+
+SHEET_NAME = "DOV"
+_templates = {} # path -> (modification time, loaded workbook, lock for filling it in)
+_templatesLock = threading.Lock()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def loadTemplate(path):
+    """Returns the DOV calculator workbook and the lock for filling it in, loaded once per process unless it changes."""
+    mtime = os.path.getmtime(path)
+    with _templatesLock:
+        cached = _templates.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, xl.load_workbook(path), threading.Lock())
+            _templates[path] = cached
+    return cached[1], cached[2]
+
+def fillTemplate(template_path, cells, filename):
+    """Saves a copy of the DOV calculator with the given DOV sheet cells filled in.
+
+    Parameters
+    ~~~~~~~~~~
+    template_path : str
+        The path to the DOV calculator Excel document.
+    cells : dict
+        The value of each cell to fill in, e.g. {"B5": "1.23"}. Values are
+        written as given, like the text read from the CSVs; numbers must be
+        finite, as Excel can't open a cell holding nan or inf.
+    filename : str
+        The path to save the copy to.
+
+    """
+    for ref, value in cells.items():
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError("Cell {} can't be set to {}".format(ref, value))
+    dovCalc, lock = loadTemplate(template_path)
+    with lock:
+        dataSheet = dovCalc[SHEET_NAME]
+        original = {ref: dataSheet[ref].value for ref in cells}
+        try:
+            for ref, value in cells.items():
+                dataSheet[ref] = value
+            dovCalc.save(filename)
+        finally:
+            # the next copy starts from the template again
+            for ref, value in original.items():
+                dataSheet[ref] = value
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class workbookWriter:
+    """Background thread that fills in and saves copies of the DOV calculator.
+
+    Parameters
+    ~~~~~~~~~~
+    maxQueued : int, optional
+        The number of copies that may wait to be saved before submit blocks.
+
+    """
+    def __init__(self, maxQueued=16):
+        self._queue = queue.Queue(maxsize=maxQueued)
+        self._thread = threading.Thread(target=self._work, name="workbookWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        # batch worker processes exit without running atexit, but do run these
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def submit(self, template_path, cells, filename):
+        """Queues a copy of the template with the given cells to be saved as filename."""
+        self._queue.put((template_path, cells, filename))
+
+    def flush(self):
+        """Waits until every queued copy has been saved."""
+        self._queue.join()
+
+    def close(self):
+        """Saves any queued copies and stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            template_path, cells, filename = job
+            try:
+                fillTemplate(template_path, cells, filename)
+                print("File saved: {}".format(filename))
+            except Exception as error:
+                print("Failed to save {}: {}".format(filename, error))
+            self._queue.task_done()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+_defaultWriter = None
+_defaultPid = None
+_defaultLock = threading.Lock()
+
+def getWorkbookWriter():
+    """Returns this process's workbook writer."""
+    global _defaultWriter, _defaultPid
+    with _defaultLock:
+        # a forked worker process doesn't get its parent's writer thread, so starts its own
+        if _defaultWriter is None or _defaultPid != os.getpid():
+            _defaultWriter = workbookWriter()
+            _defaultPid = os.getpid()
+        return _defaultWriter
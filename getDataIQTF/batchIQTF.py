@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""IQTF Batch Extractor
+
+This module extracts IQTF data from many images at once by spreading them
+across a pool of worker processes, each running its own OCR. Results are
+streamed back as each image finishes, and also collected in the order the
+images were given, along with timing for each image and for the batch.
+Each result is a record (see iqtfRecords), which can also be written to a
+file as it arrives; records that finish before an earlier image's are held
+back, so the file is in the order the images were given.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from getDataIQTF import extractIQTFrecord
+from iqtfRecords import newRecord, formatRecord, orderedWriter
+from ocrBackend import getEngine
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _startWorker():
+    """Starts the worker's OCR engine up front, so the first image doesn't pay for it."""
+    try:
+        getEngine()
+    except Exception as error:
+        print("Failed to start OCR engine: {}".format(error))
+
+def _timedExtract(index, image_path, options):
+    """Extracts a record from one image and returns it with its position and time taken."""
+    start = time.perf_counter()
+    try:
+        record = extractIQTFrecord(image_path, **options)
+    except Exception as error:
+        # one unreadable image shouldn't stop the rest of the batch
+        print("Failed to extract data from {}: {}".format(image_path, error))
+        record = newRecord(image_path, seconds=time.perf_counter() - start)
+    return index, image_path, record, time.perf_counter() - start
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def iterExtractIQTFdata(image_paths, workers=None, **options):
+    """Extracts IQTF records from the given images, yielding each as it completes.
+
+    Parameters
+    ~~~~~~~~~~
+    image_paths : list
+        The paths of the images to extract data from.
+    workers : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+        With 1 worker the images are processed in this process.
+    options : optional
+        Keyword arguments passed on to extractIQTFrecord.
+
+    Yields
+    ~~~~~~
+    index : int
+        The position of the image in image_paths.
+    image_path : str
+        The path of the image.
+    record : dict
+        The record of the image's data, from extractIQTFrecord.
+    seconds : float
+        The time taken to extract the data.
+
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(image_paths)))
+    if workers == 1:
+        for index, image_path in enumerate(image_paths):
+            yield _timedExtract(index, image_path, options)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_startWorker) as pool:
+        futures = [pool.submit(_timedExtract, index, image_path, options) for index, image_path in enumerate(image_paths)]
+        for future in as_completed(futures):
+            yield future.result()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def extractIQTFbatch(image_paths, workers=None, progress=None, writer=None, **options):
+    """Extracts IQTF records from the given images and returns them in order.
+
+    Parameters
+    ~~~~~~~~~~
+    image_paths : list
+        The paths of the images to extract data from.
+    workers : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+    progress : function, optional
+        Called as progress(done, total, image_path, record, seconds) as each
+        image completes.
+    writer : optional
+        A record writer from iqtfRecords.recordWriter; each record is written
+        as soon as the records of the images before it have been.
+    options : optional
+        Keyword arguments passed on to extractIQTFrecord.
+
+    Returns
+    ~~~~~~~
+    records : list
+        The record for each image, in the same order as image_paths.
+
+    """
+    records = [None] * len(image_paths)
+    seconds = []
+    ordered = orderedWriter(writer) if writer is not None else None
+    start = time.perf_counter()
+    for done, (index, image_path, record, taken) in enumerate(iterExtractIQTFdata(image_paths, workers, **options), 1):
+        records[index] = record
+        seconds.append(taken)
+        if ordered is not None:
+            ordered.write(index, record)
+        if progress is not None:
+            progress(done, len(image_paths), image_path, record, taken)
+    elapsed = time.perf_counter() - start
+    if seconds:
+        print("Extracted {} images in {:.2f} s ({:.2f} images/s, {:.2f} s per image on average)".format(
+            len(seconds), elapsed, len(seconds) / elapsed, sum(seconds) / len(seconds)))
+    return records
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def printProgress(done, total, image_path, record, seconds):
+    """Prints the result of each image as it completes."""
+    print("[{}/{}] {:.2f} s  {}".format(done, total, seconds, formatRecord(record) or os.path.basename(image_path) + ": no data found"))
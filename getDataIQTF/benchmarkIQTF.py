@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+""" IQTF Extraction Benchmark
+
+This script measures how fast and how accurately the IQTF data extractor
+reads results. Synthetic Uniformity and Field of View result images are
+drawn with known values, so it runs offline with only tesseract installed,
+and each preprocessing preset and worker count is timed over the same
+images. The per-image latency percentiles, throughput and the share of
+each field read correctly are printed and saved as a JSON report, so runs
+can be compared after changes to the extractor.
+
+The tools' cache folder is pointed at a temporary folder while it runs, so
+the regions learned from the synthetic images don't replace the ones
+learned from real results, and the learned regions are cleared before each
+run so every run finds the layout itself.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
+import cv2
+import iqtfRegions
+from batchIQTF import extractIQTFbatch
+from iqtfPreprocess import PRESET_ORDER
+from ocrCache import tesseractVersion
+
+FIELD_TOLERANCE = 0.005 # values are drawn with 2 decimals
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _drawLines(lines, width=900, height=600):
+    """Returns a white image with the given lines of text drawn down its left side."""
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    # a plot placeholder, as the real results have graphs beside the text
+    cv2.rectangle(img, (width // 2, 60), (width - 40, height - 60), (200, 120, 40), 2)
+    y = 40
+    for line in lines:
+        if line:
+            cv2.putText(img, line, (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 1, cv2.LINE_AA)
+        y += 34
+    return img
+
+def renderUniformity(worst):
+    """Returns a synthetic Uniformity result image whose worst value is the given percentage."""
+    return _drawLines([
+        "Y (luminance) contours Normalized",
+        "",
+        "mean = 1.00",
+        "best = 0.00% (0.00%)",
+        "worst = {:.2f}% ({:.2f}%)".format(worst, worst),
+        "corners = 0.50",
+    ])
+
+def renderFOV(lgdCorner, fov):
+    """Returns a synthetic Field of View result image with the given distortion and FOV."""
+    return _drawLines([
+        "Lens Geometric Distortion",
+        "",
+        "SMIA TV Distortion = 0.10%",
+        "3rd order LGD (corner) = {:.2f}%".format(lgdCorner),
+        "Field of View = {:.2f} degrees".format(fov),
+    ])
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def renderImages(folder, count, seed=0):
+    """Writes count synthetic result images (half of each test) and returns their known values.
+
+    Returns
+    ~~~~~~~
+    expected : dict
+        The path of each image mapped to the value of each of its fields.
+
+    """
+    rng = np.random.default_rng(seed)
+    expected = {}
+    for i in range(count):
+        eye = "left" if i % 4 < 2 else "right"
+        if i % 2 == 0:
+            values = {"worst": round(float(rng.uniform(1, 40)), 2)}
+            img = renderUniformity(values["worst"])
+            name = "Uniformity_BENCH{}_Run1_{}.png".format(i, eye)
+        else:
+            values = {"lgdCorner": round(float(rng.uniform(-20, 5)), 2), "fov": round(float(rng.uniform(60, 120)), 2)}
+            img = renderFOV(values["lgdCorner"], values["fov"])
+            name = "FOV_BENCH{}_Run1_{}.png".format(i, eye)
+        path = os.path.join(folder, name).replace('\\', '/') # the extractor splits names on '/'
+        cv2.imwrite(path, img)
+        expected[path] = values
+    return expected
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def isolateCache(folder):
+    """Keeps the regions learned while benchmarking in the given folder instead of the tools' cache folder."""
+    # worker processes started fresh (Windows) find the folder from the environment
+    os.environ["RADTOOLS_CACHE"] = folder
+    iqtfRegions.LEARNED_PATH = os.path.join(folder, "iqtfRegions.json")
+
+def resetRegions():
+    """Forgets the learned regions, in this process and on disk."""
+    iqtfRegions._regions = None
+    if os.path.exists(iqtfRegions.LEARNED_PATH):
+        os.remove(iqtfRegions.LEARNED_PATH)
+
+def benchmarkRun(expected, preset, workers, regions=True):
+    """Extracts every image with one preset and worker count, and returns its timing and accuracy."""
+    paths = list(expected)
+    resetRegions() # so each run pays for finding the layout, and the runs compare fairly
+    start = time.perf_counter()
+    records = extractIQTFbatch(paths, workers, preset=preset, retry=False, regions=regions, useCache=False)
+    elapsed = time.perf_counter() - start
+    seconds = np.array([record["seconds"] or 0.0 for record in records])
+    correct = {}
+    for path, record in zip(paths, records):
+        for field, value in expected[path].items():
+            read = record.get(field)
+            correct.setdefault(field, []).append(read is not None and abs(read - value) < FIELD_TOLERANCE)
+    allCorrect = [all(record.get(field) is not None and abs(record[field] - value) < FIELD_TOLERANCE
+                      for field, value in expected[path].items()) for path, record in zip(paths, records)]
+    return {
+        "preset": preset,
+        "workers": workers,
+        "regions": regions,
+        "images": len(paths),
+        "seconds": round(elapsed, 3),
+        "imagesPerSecond": round(len(paths) / elapsed, 3),
+        "latency": {
+            "mean": round(float(seconds.mean()), 4),
+            "p50": round(float(np.percentile(seconds, 50)), 4),
+            "p90": round(float(np.percentile(seconds, 90)), 4),
+            "p99": round(float(np.percentile(seconds, 99)), 4),
+            "max": round(float(seconds.max()), 4),
+        },
+        "accuracy": dict({field: round(sum(hits) / len(hits), 4) for field, hits in correct.items()},
+                         all=round(sum(allCorrect) / len(allCorrect), 4)),
+    }
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-n", "--images",
+        type=int,
+        default=24,
+        help="The number of synthetic images to extract"
+    )
+    argParser.add_argument(
+        "-p", "--presets",
+        nargs='+',
+        choices=PRESET_ORDER,
+        default=PRESET_ORDER,
+        help="The preprocessing presets to time"
+    )
+    argParser.add_argument(
+        "-j", "--workers",
+        type=int,
+        nargs='+',
+        default=[1, os.cpu_count() or 1],
+        help="The worker counts to time"
+    )
+    argParser.add_argument(
+        "--full",
+        action="store_true",
+        help="OCR the whole image instead of only the regions holding the data"
+    )
+    argParser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="benchmarkIQTF.json",
+        help="The JSON report to write"
+    )
+    argParser.add_argument(
+        "--keep",
+        type=str,
+        help="Write the synthetic images to this folder and keep them"
+    )
+    args = argParser.parse_args()
+
+    folder = args.keep or tempfile.mkdtemp(prefix="benchmarkIQTF")
+    os.makedirs(folder, exist_ok=True)
+    cache = tempfile.mkdtemp(prefix="benchmarkIQTFcache")
+    isolateCache(cache)
+    expected = renderImages(folder, args.images)
+    runs = []
+    for preset in args.presets:
+        for workers in sorted(set(args.workers)):
+            runs.append(benchmarkRun(expected, preset, workers, not args.full))
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "ocr": tesseractVersion(),
+        "cpus": os.cpu_count(),
+        "runs": runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if not args.keep:
+        for path in expected:
+            os.remove(path)
+        os.rmdir(folder)
+    shutil.rmtree(cache, ignore_errors=True)
+
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ Benchmark Results ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    print("{:<10}{:>8}{:>12}{:>10}{:>10}{:>10}{:>10}".format("preset", "workers", "images/s", "p50 s", "p90 s", "p99 s", "accuracy"))
+    for run in runs:
+        print("{:<10}{:>8}{:>12.2f}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.1%}".format(
+            run["preset"], run["workers"], run["imagesPerSecond"], run["latency"]["p50"],
+            run["latency"]["p90"], run["latency"]["p99"], run["accuracy"]["all"]))
+    print("Report saved to {}".format(args.output))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    multiprocessing.freeze_support() # for worker processes in the Windows executable
+    main()
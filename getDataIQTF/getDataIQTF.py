@@ -7,14 +7,23 @@ filter out the desired data to document for the IQTF analysis.
 Author: Dimitri Mojsejenko
 """
 import os
+import sys
 import glob
-import subprocess
+import time
 import argparse
-from pytesseract import pytesseract # optical recognition
+import multiprocessing
 import cv2 # computer-vision library
 import re # regular expressions
 from tkinter import *
 from tkinter.filedialog import askopenfilename
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import picturesFolder
+from iqtfRegions import FIELDS, extractRegions
+from iqtfPreprocess import PRESETS, PRESET_ORDER, presetLadder, preprocess
+from ocrCache import cacheKey, getCached, putCached
+from iqtfRecords import newRecord, formatRecord, recordWriter
+from ocrBackend import ENGINES, getEngine # optical recognition
 
 class getDataIQTF(Frame):
     """Data Extractor IQTF GUI"""
@@ -48,12 +57,8 @@ class getDataIQTF(Frame):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def _chooseFile(self, tkEntry):
         """Opens user dialogue asking for file, and stores name of file into given Tkinter entry"""
-        # get the current user profile to start file dialogue at user's Pictures folder
-        user = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-        if os.name == "nt":
-            pictures = "C:\\Users\\" + user + "\\OneDrive - JNJ\\Pictures\\"
-        else:
-            pictures = "/mnt/c/Users/" + user + "/OneDrive - JNJ/Pictures/"
+        # start file dialogue at user's Pictures folder
+        pictures = picturesFolder()
         fname = askopenfilename(filetypes=[("PNG", ".png"),("JPG", ".jpg")], initialdir=pictures, title="Select image(s)", multiple=True)
         tkEntry.delete(0,END)
         tkEntry.insert(0,fname)
@@ -61,25 +66,36 @@ class getDataIQTF(Frame):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def _extractIQTFdataGUI(self, tkEntry):
         """Extracts IQTF data for given path to image or list of paths to images"""
+        from batchIQTF import extractIQTFbatch, printProgress # batchIQTF imports this module
         images = tkEntry.strip('{}').split('} {') # remove brackets added by file dialogue box
-        results = []
         print("~~~~~~~~~~~~~~~~~~~~~~~~~~~ Extracting Data from Images ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-        for image in images:
-            results.append(extractIQTFdata(image))
+        records = extractIQTFbatch(images, progress=printProgress)
         # print results
         print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ Extracted Data ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-        for result in results:
-            print(result)
+        for record in records:
+            print(formatRecord(record))
         print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def extractIQTFdata(image_path):
+def extractIQTFdata(image_path, regions=True, useCache=True, rebuildCache=False, preset="fast", retry=True):
     """Given a path to an image from an IQTF Uniformity/FoV test, returns the relevant data.
     
     Parameters
     ~~~~~~~~~~
     image_path : str
         The path of the image to extract data from.
+    regions : bool, optional
+        OCR only the regions of the image holding the data, falling back to 
+        the whole image if they can't be read.
+    useCache : bool, optional
+        Return the cached result if this image was already read with the same 
+        settings, and cache new results.
+    rebuildCache : bool, optional
+        Read the image even if its result is cached, replacing the cached result.
+    preset : str, optional
+        The OCR preprocessing preset to start with (see iqtfPreprocess).
+    retry : bool, optional
+        Try again with each costlier preset while the expected fields are missing.
         
     Returns
     ~~~~~~~
@@ -87,47 +103,107 @@ def extractIQTFdata(image_path):
         The result of the test, or empty string if not found.
     
     """
+    return formatRecord(extractIQTFrecord(image_path, regions, useCache, rebuildCache, preset, retry))
 
-    # Open the image & store it in an image object.
-    img = cv2.imread(image_path)
-    # Resize image for better optical recognition
-    #images = []
-    #images.append(cv2.resize(img, None, fx=1.2, fy=1.2)) # cv2.INTER_LINEAR
-    #images.append(cv2.resize(img, None, fx=1.2, fy=1.2, interpolation=cv2.INTER_CUBIC))
-    #images.append(cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC))
-    #images.append(cv2.resize(img, None, fx=1.2, fy=1.2, interpolation=cv2.INTER_LANCZOS4))
-    #images.append(cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_LANCZOS4))
-    image = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_LANCZOS4)
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def extractIQTFrecord(image_path, regions=True, useCache=True, rebuildCache=False, preset="fast", retry=True):
+    """Given a path to an image from an IQTF Uniformity/FoV test, returns a record of its data.
     
-    # Provide the tesseract executable location to pytesseract library (based on OS)
-    if not os.name == "nt":
-        pytesseract.tesseract_cmd = 'tesseract'
-    else: # Windows
-        pytesseract.tesseract_cmd = r"C:\Users\wmojseje\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
+    Takes the same parameters as extractIQTFdata.
+        
+    Returns
+    ~~~~~~~
+    record : dict
+        The image's test type, scope, run, eye, values, OCR confidence and 
+        timing (see iqtfRecords.RECORD_FIELDS); its text is None if no data 
+        was found.
     
+    """
+    start = time.perf_counter()
     image_name = image_path.split('/')[-1].rstrip('.png')
     print(image_name)
-    result = image_name+": "
+    
+    # Reuse the result if this image was already read with the same settings
+    if useCache:
+        settings = {"regions": regions, "presets": [PRESETS[p] for p in presetLadder(preset, retry)], "record": 2}
+        key = cacheKey(image_path, settings)
+        cached = None if rebuildCache else getCached(key)
+        if cached is not None:
+            print("Cached IQTF data found.")
+            print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+            cached["method"] = "cache"
+            return newRecord(image_path, seconds=time.perf_counter() - start, **cached)
+    
+    # Open the image & store it in an image object.
+    img = cv2.imread(image_path)
+    
+    # Start cheap, and only pay for costlier preprocessing when fields are missing
+    best = None
+    for attempt in presetLadder(preset, retry):
+        read = _readIQTFdata(img, image_name, regions, attempt)
+        fields = FIELDS.get(read[0], [])
+        found = sum(1 for field in fields if read[1].get(field)) if read[0] else -1
+        if best is None or found > best[0]:
+            best = (found, attempt, read)
+        if fields and found == len(fields):
+            break
+        print("Expected IQTF data not found with the {} preset.".format(attempt))
+    found, attempt, (testType, values, text, confidence, method) = best
+    if useCache:
+        putCached(key, {"testType": testType, "values": values, "text": text, "confidence": confidence,
+                        "preset": attempt})
+    return newRecord(image_path, testType, values, text, confidence, method, time.perf_counter() - start, attempt)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _readIQTFdata(img, image_name, regions, preset):
+    """Reads the IQTF data from an image with OCR, using one preprocessing preset.
+    
+    Returns the test type, the text read for each field, the data as printed 
+    after the image name (None if not found), the OCR confidence, and which 
+    method read it ("regions" or "full").
+    """
+    # Try reading only the lines holding the data first
+    if regions:
+        testType, values, confidence = extractRegions(img, image_name, preset)
+        fields = FIELDS.get(testType, [])
+        if fields and all(values.get(field) for field in fields):
+            if testType == "Uniformity":
+                print("IQTF Uniformity data found.")
+            else:
+                print("IQTF Field of View data found.")
+            print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+            return testType, values, ", ".join(values[field] for field in fields), confidence, "regions"
+        print("Data regions not found, reading whole image.")
+    
+    # Resize (and clean up) image for better optical recognition
+    image = preprocess(img, preset)
     
     # Extract text from image
-    image_text = pytesseract.image_to_string(image)
+    engine = getEngine()
+    image_text = engine.text(image)
     
     # Split text into lines
     text_lines = image_text.split('\n')
+    testType = None
+    values = {}
+    result = ""
     
     # Check which test the image is from
     if "Y (luminance) contours Normalized" in text_lines: # Uniformity
         print("IQTF Uniformity data found.")
+        testType = "Uniformity"
         
         for line in text_lines:
             # Extract relevant data
             if "worst =" in line:
                 index_L = line.index("(")
                 index_R = line.index(")")
-                result += line[index_L+1:index_R]
+                values["worst"] = line[index_L+1:index_R]
+                result += values["worst"]
         
     elif "Lens Geometric Distortion" in text_lines[0]: # Field of View
         print("IQTF Field of View data found.")
+        testType = "FOV"
         
         # regular expressions for data to extract
         thirdOrdCorner = re.compile("3.+LGD\s\(co")
@@ -136,20 +212,22 @@ def extractIQTFdata(image_path):
         for line in text_lines:
             if re.match(thirdOrdCorner, line):
                 try:
-                    result += line.split('=')[1].strip() + ", "
+                    values["lgdCorner"] = line.split('=')[1].strip()
+                    result += values["lgdCorner"] + ", "
                 except Exception as error:
                     print(error)
                     result += "error"
             elif re.match(fovResult, line):
                 try:
-                    result += line.split('=')[1].split()[0]
+                    values["fov"] = line.split('=')[1].split()[0]
+                    result += values["fov"]
                 except Exception as error:
                     print(error)
                     result += "error"
     else:
-        result = ""
+        result = None
     print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")       
-    return result
+    return testType, values, result, engine.confidence, "full"
     
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~    
 def main():
@@ -160,26 +238,88 @@ def main():
         type=str,
         help="The path to the image or folder of images to extract data from."
     )
+    argParser.add_argument(
+        "-j", "--workers",
+        type=int,
+        help="The number of images to extract data from at once (default: number of CPUs)"
+    )
+    argParser.add_argument(
+        "-o", "--output",
+        type=str,
+        help="Also write a record of each image to this .csv, .jsonl or .parquet file "
+             "(when watching, the .csv or .jsonl file appended to; default: iqtfResults.csv in the folder)"
+    )
+    argParser.add_argument(
+        "-w", "--watch",
+        action="store_true",
+        help="Watch the given folder and extract data from images as they are written"
+    )
+    argParser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't use or save cached results"
+    )
+    argParser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Read every image again and replace its cached result"
+    )
+    argParser.add_argument(
+        "--ocr",
+        choices=sorted(ENGINES),
+        help="The OCR engine to use (default: tesserocr if installed, else pytesseract)"
+    )
+    argParser.add_argument(
+        "--preset",
+        choices=PRESET_ORDER,
+        default="fast",
+        help="The OCR preprocessing preset to start with (default: fast)"
+    )
+    argParser.add_argument(
+        "--no-retry",
+        action="store_true",
+        help="Don't retry with costlier presets when data is missing"
+    )
+    argParser.add_argument(
+        "--full",
+        action="store_true",
+        help="OCR the whole image instead of only the regions holding the data"
+    )
     args = argParser.parse_args()
+    if args.watch and args.output and args.output.lower().endswith(".parquet"):
+        # a watch appends each record as it arrives, which Parquet files can't do
+        argParser.error("--watch needs a .csv or .jsonl --output file, as Parquet files can't be appended to")
+    if args.ocr:
+        os.environ["RADTOOLS_OCR_BACKEND"] = args.ocr # read by each worker process too
     
     result = []
+    writer = recordWriter(args.output) if args.output and not args.watch else None
+    options = dict(regions=not args.full, preset=args.preset, retry=not args.no_retry,
+                   useCache=not args.no_cache, rebuildCache=args.rebuild_cache)
 
     # check if intended as stand-alone command or interactive GUI (no args)
     if args.imagePath:
         # Check if imagePath is a single image or folder of images
-        if os.path.isdir(args.imagePath):
+        if args.watch:
+            from watchIQTF import watchFolder
+            watchFolder(args.imagePath, args.output, args.workers, **options)
+        elif os.path.isdir(args.imagePath):
             print("Given path is a directory.")
             imageList = glob.glob(args.imagePath+"*.png")
             print("The following images were found:")
-            result = []
             for f in imageList:
                 print(f)
-                result.append(extractIQTFdata(f))
+            from batchIQTF import extractIQTFbatch, printProgress # batchIQTF imports this module
+            result = extractIQTFbatch(imageList, args.workers, printProgress, writer, **options)
             for res in result:
-                print(res)
+                print(formatRecord(res))
         else: # single image
-            result = extractIQTFdata(args.imagePath)
-            print(result)
+            result = extractIQTFrecord(args.imagePath, **options)
+            if writer is not None:
+                writer.write(result)
+            print(formatRecord(result))
+        if writer is not None:
+            writer.close()
     else:
         # GUI
         root = Tk()
@@ -202,4 +342,5 @@ def main():
     
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # for worker processes in the Windows executable
     main()    
\ No newline at end of file
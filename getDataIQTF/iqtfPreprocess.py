@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""IQTF OCR Preprocessing
+
+This module prepares IQTF result images (or the regions cut from them) for
+OCR. The steps are grayscale conversion, denoising, resizing and
+binarization, and which of them are used is set by named presets that trade
+speed for accuracy:
+    * fast: grayscale, 2x linear upscale
+    * balanced: colour, 2x Lanczos upscale (the extractor's original settings)
+    * accurate: grayscale, denoised, 3x cubic upscale, Otsu binarization
+
+The extractor starts with a cheap preset and only moves to the next one in
+PRESET_ORDER when the expected fields aren't found.
+
+Author: Dimitri Mojsejenko
+"""
+import cv2
+
+INTERPOLATIONS = {
+    "NEAREST": cv2.INTER_NEAREST,
+    "LINEAR": cv2.INTER_LINEAR,
+    "AREA": cv2.INTER_AREA,
+    "CUBIC": cv2.INTER_CUBIC,
+    "LANCZOS4": cv2.INTER_LANCZOS4,
+}
+PRESETS = {
+    "fast": {"grayscale": True, "denoise": False, "scale": 2, "interpolation": "LINEAR", "binarize": False},
+    "balanced": {"grayscale": False, "denoise": False, "scale": 2, "interpolation": "LANCZOS4", "binarize": False},
+    "accurate": {"grayscale": True, "denoise": True, "scale": 3, "interpolation": "CUBIC", "binarize": True},
+}
+PRESET_ORDER = ["fast", "balanced", "accurate"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def presetLadder(preset, retry=True):
+    """Returns the presets to try in order: the given one, then each costlier one if retrying."""
+    if preset not in PRESETS:
+        raise ValueError("Unknown preset: {} (choose from {})".format(preset, ", ".join(PRESET_ORDER)))
+    if not retry:
+        return [preset]
+    return PRESET_ORDER[PRESET_ORDER.index(preset):]
+
+def preprocess(img, preset="balanced"):
+    """Returns an image prepared for OCR with the steps of the given preset.
+
+    Parameters
+    ~~~~~~~~~~
+    img : numpy.ndarray
+        The BGR (or grayscale) image.
+    preset : str or dict, optional
+        The name of a preset, or a dict of steps like those in PRESETS.
+
+    Returns
+    ~~~~~~~
+    image : numpy.ndarray
+        The preprocessed image; grayscale if the preset converts or binarizes.
+
+    """
+    steps = PRESETS[preset] if isinstance(preset, str) else preset
+    image = img
+    if (steps["grayscale"] or steps["binarize"]) and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if steps["denoise"]:
+        # a small median removes JPEG and sensor speckle without blurring the text edges much
+        image = cv2.medianBlur(image, 3)
+    if steps["scale"] != 1:
+        image = cv2.resize(image, None, fx=steps["scale"], fy=steps["scale"],
+                           interpolation=INTERPOLATIONS[steps["interpolation"]])
+    if steps["binarize"]:
+        # after upscaling, so the threshold works on the smoothed letter edges
+        _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return image
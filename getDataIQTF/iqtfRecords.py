@@ -0,0 +1,274 @@
+#!/usr/bin/python3
+"""IQTF Records
+
+This module holds IQTF results as records (one dict per image) with typed
+fields, instead of the "name: value, value" text printed by the extractor,
+and writes them to CSV, JSONL or Parquet files one record at a time, so
+results from thousands of runs can be collected without parsing console
+output.
+
+The scope, run and eye of each image are taken from its filename, as named
+by the IQTF image capture GUI, e.g. "Uniformity_S1234_Run2_right.png".
+
+Run this module as a script to check that records finishing out of order
+are written in the order of their images.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import re
+import csv
+import json
+import random
+import tempfile
+import argparse
+
+# the fields of each record, in the order they are written
+RECORD_FIELDS = ["image", "testType", "scope", "run", "eye", "worst", "lgdCorner", "fov",
+                 "text", "confidence", "method", "preset", "seconds"]
+RECORD_TYPES = ["str", "str", "str", "int", "str", "float", "float", "float",
+                "str", "float", "str", "str", "float"]
+
+_number = re.compile(r"[-+]?\d*\.?\d+")
+_run = re.compile(r"run(\d+)$", re.IGNORECASE)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def nameFields(image_name):
+    """Returns the test type, scope, run and eye given by an image's filename.
+
+    Returns
+    ~~~~~~~
+    fields : dict
+        The testType, scope, run and eye, each None if not in the name.
+
+    """
+    fields = {"testType": None, "scope": None, "run": None, "eye": None}
+    tokens = os.path.splitext(os.path.basename(image_name))[0].split('_')
+    if tokens and tokens[0].lower() == "uniformity":
+        fields["testType"] = "Uniformity"
+    elif tokens and tokens[0].lower() == "fov":
+        fields["testType"] = "FOV"
+    for i, token in enumerate(tokens):
+        run = _run.match(token)
+        if run:
+            fields["run"] = int(run.group(1))
+        elif token.lower() in ("left", "right"):
+            fields["eye"] = token.lower()
+        elif i == 1 and fields["testType"]:
+            fields["scope"] = token # the capture GUI puts the scope right after the test
+    return fields
+
+def toNumber(text):
+    """Returns the first number in the text (e.g. "1.23%" or "-4.5 deg") as a float, or None."""
+    if text is None:
+        return None
+    match = _number.search(text)
+    return float(match.group()) if match else None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def newRecord(image_path, testType=None, values=None, text=None, confidence=None, method=None, seconds=None,
+              preset=None):
+    """Returns the record for an image.
+
+    Parameters
+    ~~~~~~~~~~
+    image_path : str
+        The path of the image.
+    testType : str, optional
+        "Uniformity" or "FOV", or None if the image isn't an IQTF result.
+    values : dict, optional
+        The text read for each field ("worst", "lgdCorner", "fov").
+    text : str, optional
+        The data as printed after the image name, or None if none was found.
+    confidence : float, optional
+        The OCR confidence (0 to 100), if known.
+    method : str, optional
+        How the data was read: "regions", "full" or "cache".
+    seconds : float, optional
+        The time taken to read the data.
+    preset : str, optional
+        The preprocessing preset the data was read with.
+
+    """
+    record = dict.fromkeys(RECORD_FIELDS)
+    record.update(nameFields(image_path))
+    values = values or {}
+    record.update({
+        "image": image_path,
+        "testType": testType or record["testType"],
+        "worst": toNumber(values.get("worst")),
+        "lgdCorner": toNumber(values.get("lgdCorner")),
+        "fov": toNumber(values.get("fov")),
+        "text": text,
+        "confidence": confidence,
+        "method": method,
+        "preset": preset,
+        "seconds": round(seconds, 4) if seconds is not None else None,
+    })
+    return record
+
+def formatRecord(record):
+    """Returns a record as the extractor prints it, "name: data", or empty string if no data was found."""
+    if record is None or record["text"] is None:
+        return ""
+    image_name = record["image"].split('/')[-1].rstrip('.png')
+    return image_name+": "+record["text"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class csvRecordWriter:
+    """Writes records to a CSV file as they are given."""
+    def __init__(self, path, append=False):
+        new = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a' if append else 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=RECORD_FIELDS, extrasaction='ignore')
+        if new:
+            self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self._file.flush() # so the file can be read while records are still coming
+
+    def close(self):
+        self._file.close()
+
+class jsonlRecordWriter:
+    """Writes records to a JSON Lines file as they are given."""
+    def __init__(self, path, append=False):
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, record):
+        self._file.write(json.dumps({field: record.get(field) for field in RECORD_FIELDS}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class parquetRecordWriter:
+    """Writes records to a Parquet file in row groups of batchSize records (needs pyarrow)."""
+    def __init__(self, path, append=False, batchSize=1000):
+        if append:
+            raise ValueError("Parquet files can't be appended to")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+        self._schema = pa.schema([(field, types[kind]) for field, kind in zip(RECORD_FIELDS, RECORD_TYPES)])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self.batchSize = batchSize
+        self._batch = []
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if self._batch:
+            columns = {field: [record.get(field) for record in self._batch] for field in RECORD_FIELDS}
+            self._writer.write_table(self._pa.table(columns, schema=self._schema))
+            self._batch = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+class orderedWriter:
+    """Writes records to another writer in the order of their index, holding back any that finish early.
+
+    Parameters
+    ~~~~~~~~~~
+    writer :
+        The record writer to write to, from recordWriter.
+    start : int, optional
+        The index of the first record.
+
+    """
+    def __init__(self, writer, start=0):
+        self.writer = writer
+        self._next = start
+        self._waiting = {} # index -> record finished before an earlier one
+
+    def write(self, index, record):
+        """Writes the record, once every record with a lower index has been written."""
+        self._waiting[index] = record
+        while self._next in self._waiting:
+            self.writer.write(self._waiting.pop(self._next))
+            self._next += 1
+
+    def waiting(self):
+        """Returns the number of records held back until an earlier one is written."""
+        return len(self._waiting)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+WRITERS = {".csv": csvRecordWriter, ".jsonl": jsonlRecordWriter, ".json": jsonlRecordWriter,
+           ".parquet": parquetRecordWriter}
+
+def recordWriter(path, append=False):
+    """Returns a writer for the file type given by the path's extension (.csv, .jsonl or .parquet)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError("Unknown record file type: " + path)
+    return WRITERS[extension](path, append=append)
+
+def recordedImages(path):
+    """Returns the paths of the images already recorded in a CSV or JSONL file."""
+    images = set()
+    try:
+        with open(path, 'r', newline='') as f:
+            if path.lower().endswith(".csv"):
+                for row in csv.DictReader(f):
+                    images.add(row.get("image"))
+            else:
+                for line in f:
+                    try:
+                        images.add(json.loads(line)["image"])
+                    except (ValueError, KeyError):
+                        pass
+    except OSError:
+        pass
+    return images
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-n", "--images",
+        type=int,
+        default=50,
+        help="The number of records to write out of order"
+    )
+    args = argParser.parse_args()
+
+    paths = ["Uniformity_S{}_Run1_right.png".format(i) for i in range(args.images)]
+    # finish the records in a shuffled order, as the batch's worker processes do
+    finished = list(range(args.images))
+    random.Random(0).shuffle(finished)
+    folder = tempfile.mkdtemp(prefix="iqtfRecords")
+    problems = []
+    for extension in (".csv", ".jsonl"):
+        path = os.path.join(folder, "records" + extension)
+        writer = recordWriter(path)
+        ordered = orderedWriter(writer)
+        for index in finished:
+            ordered.write(index, newRecord(paths[index]))
+        writer.close()
+        if ordered.waiting():
+            problems.append("{} records still held back for {}".format(ordered.waiting(), extension))
+        written = recordedImages(path)
+        with open(path, 'r', newline='') as f:
+            if extension == ".csv":
+                order = [row["image"] for row in csv.DictReader(f)]
+            else:
+                order = [json.loads(line)["image"] for line in f]
+        if order != paths or written != set(paths):
+            problems.append("{} records weren't written in image order".format(extension))
+        os.remove(path)
+    os.rmdir(folder)
+    print("Wrote {} records finished out of order to CSV and JSONL".format(args.images))
+    if problems:
+        raise SystemExit("\n".join(problems))
+    print("Both files have the records in image order.")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
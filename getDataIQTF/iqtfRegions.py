@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+"""IQTF Text Regions
+
+This module reads IQTF results by OCRing only the lines of text that hold
+the data, instead of the whole (upscaled) image. Each test type has a few
+regions of interest: the "worst =" line for Uniformity, and the
+"3rd order LGD (corner)" and "Field of View" lines for Field of View.
+
+Regions are given as fractions of the image size, and come from (in order):
+    * iqtfRegions.json next to this script, if it exists (user configured)
+    * regions learned from earlier images, kept in the tools' cache folder
+    * a layout pass that OCRs the image at its original size to find the lines
+
+Each region is cropped, preprocessed (see iqtfPreprocess), and OCRed as a
+single line of text. If a region doesn't give its value, the layout is
+found again. The lowest OCR confidence of the regions is reported along
+with the values.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import re
+import sys
+import json
+from ocrBackend import getEngine
+from iqtfPreprocess import preprocess
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import cacheFolder
+
+# the fields read for each test type, in the order they are reported
+FIELDS = {"Uniformity": ["worst"], "FOV": ["lgdCorner", "fov"]}
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iqtfRegions.json")
+LEARNED_PATH = os.path.join(cacheFolder(), "iqtfRegions.json")
+
+_thirdOrdCorner = re.compile(r"3.+LGD\s\(co")
+_fovResult = re.compile(r"Field of View")
+_regions = None # test type -> {field: [x0, y0, x1, y1]} as fractions of the image size
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def testTypeFromText(line):
+    """Returns the test type if the given line of text is an IQTF result title, else None."""
+    if "Y (luminance) contours Normalized" in line:
+        return "Uniformity"
+    if "Lens Geometric Distortion" in line:
+        return "FOV"
+    return None
+
+def testTypeFromName(image_name):
+    """Returns the test type suggested by an image's filename, else None."""
+    name = image_name.lower()
+    if "uniformity" in name:
+        return "Uniformity"
+    if "fov" in name or "field of view" in name:
+        return "FOV"
+    return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def fieldInLine(field, line):
+    """Returns True if the given line of text holds the given field."""
+    if field == "worst":
+        return "worst =" in line
+    if field == "lgdCorner":
+        return re.match(_thirdOrdCorner, line) is not None
+    if field == "fov":
+        return re.match(_fovResult, line) is not None
+    return False
+
+def parseField(field, line):
+    """Returns the value of the given field from its line of text, or None if it can't be read."""
+    try:
+        if field == "worst":
+            return line[line.index("(")+1:line.index(")")]
+        if field == "lgdCorner":
+            return line.split('=')[1].strip()
+        if field == "fov":
+            return line.split('=')[1].split()[0]
+    except (ValueError, IndexError):
+        pass
+    return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def textLines(image, psm=3):
+    """OCRs an image and returns its lines of text with their bounding boxes.
+
+    Returns
+    ~~~~~~~
+    lines : list
+        A (text, [left, top, right, bottom]) tuple per line, in reading order.
+
+    """
+    return getEngine().lines(image, psm)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def locateRegions(img):
+    """Finds the test type and the regions holding its data with one OCR pass at original size.
+
+    Returns
+    ~~~~~~~
+    testType : str or None
+        "Uniformity" or "FOV", or None if the image isn't an IQTF result.
+    regions : dict
+        The region of each field found, as fractions of the image size.
+
+    """
+    (h, w) = img.shape[:2]
+    lines = textLines(img)
+    testType = None
+    for text, box in lines:
+        testType = testTypeFromText(text)
+        if testType:
+            break
+    regions = {}
+    if testType:
+        for text, (left, top, right, bottom) in lines:
+            for field in FIELDS[testType]:
+                if field not in regions and fieldInLine(field, text):
+                    # pad so the line isn't clipped if the layout shifts slightly
+                    padY = (bottom - top) // 2 + 2
+                    padX = padY * 2
+                    regions[field] = [max(0, left - padX) / w, max(0, top - padY) / h,
+                                      min(w, right + padX) / w, min(h, bottom + padY) / h]
+    return testType, regions
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def readRegions(img, regions, preset="balanced"):
+    """OCRs each region as a single line of text and returns the values read.
+
+    Parameters
+    ~~~~~~~~~~
+    img : numpy.ndarray
+        The IQTF result image.
+    regions : dict
+        The region of each field, as fractions of the image size.
+    preset : str, optional
+        The preprocessing preset applied to each region before OCR.
+
+    Returns
+    ~~~~~~~
+    values : dict
+        The value read for each field, or None where it couldn't be read.
+    confidence : float or None
+        The lowest OCR confidence (0 to 100) of the regions, if known.
+
+    """
+    (h, w) = img.shape[:2]
+    engine = getEngine()
+    values = {}
+    confidences = []
+    for field, (x0, y0, x1, y1) in regions.items():
+        crop = img[int(y0*h):int(y1*h), int(x0*w):int(x1*w)]
+        if crop.size == 0:
+            values[field] = None
+            continue
+        crop = preprocess(crop, preset)
+        # read as lines rather than plain text, as both engines report confidence for those
+        line = ' '.join(text for text, box in engine.lines(crop, psm=7))
+        values[field] = parseField(field, line) if fieldInLine(field, line) else None
+        if engine.confidence is not None:
+            confidences.append(engine.confidence)
+    return values, min(confidences) if confidences else None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def knownRegions(testType):
+    """Returns the configured or learned regions for a test type, or None."""
+    global _regions
+    if _regions is None:
+        _regions = {}
+        # configured regions take priority over learned ones
+        for path in [LEARNED_PATH, CONFIG_PATH]:
+            try:
+                with open(path, 'r') as f:
+                    _regions.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+    return _regions.get(testType)
+
+def learnRegions(testType, regions):
+    """Remembers the regions found for a test type, in this process and in the cache folder."""
+    knownRegions(testType) # make sure saved regions are loaded first
+    _regions[testType] = regions
+    try:
+        with open(LEARNED_PATH, 'r') as f:
+            learned = json.load(f)
+    except (OSError, ValueError):
+        learned = {}
+    learned[testType] = regions
+    try:
+        os.makedirs(os.path.dirname(LEARNED_PATH), exist_ok=True)
+        # write then rename, as other worker processes may be reading it
+        tmpPath = LEARNED_PATH + "." + str(os.getpid())
+        with open(tmpPath, 'w') as f:
+            json.dump(learned, f, indent=2)
+        os.replace(tmpPath, LEARNED_PATH)
+    except OSError as error:
+        print("Could not save IQTF regions: {}".format(error))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def extractRegions(img, image_name, preset="balanced"):
+    """Reads the IQTF data from only the regions of the image that hold it.
+
+    Parameters
+    ~~~~~~~~~~
+    img : numpy.ndarray
+        The IQTF result image, at its original size.
+    image_name : str
+        The name of the image, used to guess the test type.
+    preset : str, optional
+        The preprocessing preset applied to each region before OCR.
+
+    Returns
+    ~~~~~~~
+    testType : str or None
+        "Uniformity" or "FOV", or None if it couldn't be told.
+    values : dict
+        The value read for each field, or None where it couldn't be read.
+    confidence : float or None
+        The lowest OCR confidence (0 to 100) of the regions, if known.
+
+    """
+    testType = testTypeFromName(image_name)
+    regions = knownRegions(testType) if testType else None
+    if regions:
+        values, confidence = readRegions(img, regions, preset)
+        if all(values.get(field) for field in FIELDS[testType]):
+            return testType, values, confidence
+    # unknown or changed layout: find the lines again
+    testType, regions = locateRegions(img)
+    if testType is None:
+        return None, {}, None
+    values, confidence = readRegions(img, regions, preset)
+    if all(values.get(field) for field in FIELDS[testType]):
+        learnRegions(testType, regions)
+    return testType, values, confidence
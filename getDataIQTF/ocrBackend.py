@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+"""IQTF OCR Backend
+
+This module gives the IQTF data extractor a single OCR engine per process,
+created on first use and kept for the life of the process, so tesseract's
+language data is loaded once instead of for every image.
+
+Two engines are available:
+    * tesserocr: tesseract's API called in-process, with images handed over
+      straight from memory (used when the tesserocr module is installed)
+    * pytesseract: runs the tesseract executable for each call, passing the
+      image through a temporary file (the fallback)
+
+The engine is picked automatically, or set with the RADTOOLS_OCR_BACKEND
+environment variable ("tesserocr" or "pytesseract"), which worker processes
+inherit. After each call, an engine's confidence attribute holds the mean
+word confidence (0 to 100) of the text read, or None if it isn't known.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import cv2
+from pytesseract import pytesseract, Output
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Provide the tesseract executable location to pytesseract library (based on OS)
+if not os.name == "nt":
+    TESSERACT_CMD = 'tesseract'
+else: # Windows
+    TESSERACT_CMD = r"C:\Users\wmojseje\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
+pytesseract.tesseract_cmd = TESSERACT_CMD
+
+_engine = None
+_enginePid = None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class pytesseractEngine:
+    """OCR engine running the tesseract executable for each call."""
+    name = "pytesseract"
+
+    def __init__(self):
+        self.confidence = None
+        try:
+            self.version = str(pytesseract.get_tesseract_version())
+        except Exception: # not found errors are raised when reading instead
+            self.version = "unknown"
+
+    def text(self, image, psm=3):
+        """Returns the text in an image."""
+        self.confidence = None # not reported with the text
+        return pytesseract.image_to_string(image, config="--psm "+str(psm))
+
+    def lines(self, image, psm=3):
+        """Returns a (text, [left, top, right, bottom]) tuple per line of text, in reading order."""
+        data = pytesseract.image_to_data(image, config="--psm "+str(psm), output_type=Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            confidences.append(float(data["conf"][i]))
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            left, top = data["left"][i], data["top"][i]
+            right, bottom = left + data["width"][i], top + data["height"][i]
+            if key in lines:
+                words, box = lines[key]
+                words.append(word)
+                lines[key] = (words, [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)])
+            else:
+                lines[key] = ([word], [left, top, right, bottom])
+        self.confidence = sum(confidences) / len(confidences) if confidences else None
+        return [(' '.join(words), box) for words, box in lines.values()]
+
+    def close(self):
+        pass
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class tesserocrEngine:
+    """OCR engine calling tesseract's API in-process, keeping its language data loaded."""
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        # use the language data of the installed tesseract, if it can be found
+        tessdata = os.path.join(os.path.dirname(TESSERACT_CMD), "tessdata")
+        if os.path.isdir(tessdata):
+            self.api = tesserocr.PyTessBaseAPI(path=tessdata)
+        else:
+            self.api = tesserocr.PyTessBaseAPI()
+        self.confidence = None
+        self.version = tesserocr.tesseract_version().split()[1]
+
+    def _setImage(self, image, psm):
+        """Hands an OpenCV image to tesseract without copying it through a file."""
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # tesseract reads the rows with the given stride, so the data must be contiguous
+        if not image.flags['C_CONTIGUOUS']:
+            image = image.copy()
+        (h, w) = image.shape[:2]
+        depth = 1 if image.ndim == 2 else image.shape[2]
+        self.api.SetPageSegMode(psm)
+        self.api.SetImageBytes(image.tobytes(), w, h, depth, w * depth)
+
+    def text(self, image, psm=3):
+        """Returns the text in an image."""
+        self._setImage(image, psm)
+        text = self.api.GetUTF8Text()
+        self.confidence = float(self.api.MeanTextConf())
+        return text
+
+    def lines(self, image, psm=3):
+        """Returns a (text, [left, top, right, bottom]) tuple per line of text, in reading order."""
+        self._setImage(image, psm)
+        self.api.Recognize()
+        lines = []
+        level = tesserocr.RIL.TEXTLINE
+        for line in tesserocr.iterate_level(self.api.GetIterator(), level):
+            text = line.GetUTF8Text(level)
+            box = line.BoundingBox(level)
+            if text and text.strip() and box:
+                lines.append((' '.join(text.split()), list(box)))
+        self.confidence = float(self.api.MeanTextConf())
+        return lines
+
+    def close(self):
+        self.api.End()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+ENGINES = {"tesserocr": tesserocrEngine, "pytesseract": pytesseractEngine}
+
+def getEngine():
+    """Returns this process's OCR engine, creating it on first use.
+
+    Returns
+    ~~~~~~~
+    engine : tesserocrEngine or pytesseractEngine
+        The engine named by RADTOOLS_OCR_BACKEND, or tesserocr if it can be
+        started, else pytesseract.
+
+    """
+    global _engine, _enginePid
+    # engines can't be shared with worker processes, so each starts its own
+    if _engine is None or _enginePid != os.getpid():
+        name = os.environ.get("RADTOOLS_OCR_BACKEND")
+        if name:
+            _engine = ENGINES[name]()
+        else:
+            try:
+                _engine = tesserocrEngine()
+            except Exception:
+                _engine = pytesseractEngine()
+        _enginePid = os.getpid()
+    return _engine
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""IQTF OCR Cache
+
+This module keeps the results of IQTF data extraction on disk, keyed by a
+hash of the image's contents and the OCR settings used, so images that were
+already processed are not OCRed again. Renamed or copied images are still
+found, while changing the settings (or the tesseract version) misses the
+cache. The least recently used results are dropped once the cache holds
+more than a set number of results.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+from functools import lru_cache
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import cacheFolder
+from ocrBackend import getEngine
+
+CACHE_PATH = os.path.join(cacheFolder(), "iqtfOCR.sqlite")
+MAX_ENTRIES = 20000
+
+_connection = None
+_connectionPid = None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+@lru_cache(maxsize=None)
+def tesseractVersion():
+    """Returns the OCR engine and tesseract version in use (looked up once per process)."""
+    try:
+        engine = getEngine()
+        return engine.name + " " + engine.version
+    except Exception:
+        return "unknown"
+
+def cacheKey(image_path, settings):
+    """Returns the cache key for an image's contents and the given OCR settings.
+
+    Parameters
+    ~~~~~~~~~~
+    image_path : str
+        The path of the image.
+    settings : dict
+        Everything that affects the result, such as scale and interpolation.
+
+    """
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    settings = dict(settings, tesseract=tesseractVersion())
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _connect():
+    """Returns this process's connection to the cache, creating the cache if needed."""
+    global _connection, _connectionPid
+    # connections can't be shared with worker processes, so each opens its own
+    if _connection is None or _connectionPid != os.getpid():
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH, timeout=30)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT, accessed REAL)")
+        _connection.execute("CREATE INDEX IF NOT EXISTS accessedIndex ON results (accessed)")
+        _connection.commit()
+        _connectionPid = os.getpid()
+    return _connection
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def getCached(key):
+    """Returns the cached result for a key, or None if it isn't cached."""
+    try:
+        db = _connect()
+        row = db.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        db.commit()
+        return json.loads(row[0])
+    except sqlite3.Error as error:
+        print("IQTF cache unavailable: {}".format(error))
+        return None
+
+def putCached(key, result, max_entries=MAX_ENTRIES):
+    """Stores a result, dropping the least recently used results past max_entries."""
+    try:
+        db = _connect()
+        db.execute("INSERT OR REPLACE INTO results (key, result, accessed) VALUES (?, ?, ?)",
+                   (key, json.dumps(result), time.time()))
+        count = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > max_entries:
+            db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                       (count - max_entries,))
+        db.commit()
+    except sqlite3.Error as error:
+        print("IQTF cache unavailable: {}".format(error))
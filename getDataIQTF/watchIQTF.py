@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+"""IQTF Watch Folder
+
+This module watches a folder for new IQTF result images and extracts their
+data as they arrive, appending each record to a CSV or JSONL ledger, so the
+numbers are ready seconds after a capture instead of after a manual batch.
+
+On Linux the folder is watched with inotify, which reports when a file has
+been closed after writing. Elsewhere the folder is polled, and an image is
+only read once its size and modification time have stopped changing, so
+partially written files are skipped until they are complete. Images already
+in the folder but not in the ledger are read when watching starts, and an
+image written again under the same name is read again.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import sys
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+from concurrent.futures import ProcessPoolExecutor
+from batchIQTF import _startWorker, _timedExtract
+from iqtfRecords import formatRecord, recordWriter, recordedImages
+
+IMAGE_TYPES = (".png",)
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+_EVENT = struct.Struct("iIII")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def scanImages(folder):
+    """Returns the (size, modification time) of each image in the folder."""
+    found = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(IMAGE_TYPES) and entry.is_file():
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_size, stat.st_mtime)
+    except OSError as error:
+        print("Could not scan {}: {}".format(folder, error))
+    return found
+
+class pollingWatcher:
+    """Finds new or changed images by scanning the folder at an interval."""
+    def __init__(self, folder, interval=1.0):
+        self.folder = folder
+        self.interval = interval
+        self._seen = scanImages(folder)
+        self._nextScan = time.monotonic() + interval
+
+    def changes(self, timeout):
+        """Waits up to timeout seconds and returns the images changed since the last call.
+
+        Returns
+        ~~~~~~~
+        changes : list
+            A (path, complete) tuple per image; complete is always False as
+            a scan can't tell whether the image is still being written.
+
+        """
+        wait = self._nextScan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self._nextScan = time.monotonic() + self.interval
+        found = scanImages(self.folder)
+        changed = [(path, False) for path, stat in found.items() if self._seen.get(path) != stat]
+        self._seen = found
+        return changed
+
+    def close(self):
+        pass
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class inotifyWatcher:
+    """Finds new images from Linux inotify events, without scanning the folder."""
+    def __init__(self, folder):
+        self.folder = folder
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed for " + folder)
+
+    def changes(self, timeout):
+        """Waits up to timeout seconds and returns the images written since the last call.
+
+        Returns
+        ~~~~~~~
+        changes : list
+            A (path, complete) tuple per image; complete is True as the
+            image was closed after writing or moved into the folder.
+
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                print("Too many files arrived at once; some may have been missed.")
+            name = os.fsdecode(name)
+            if name.lower().endswith(IMAGE_TYPES):
+                changed.append((os.path.join(self.folder, name), True))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+def folderWatcher(folder, interval=1.0):
+    """Returns an inotify watcher on Linux, or a polling watcher if that isn't available."""
+    if sys.platform.startswith("linux"):
+        try:
+            return inotifyWatcher(folder)
+        except (OSError, AttributeError) as error:
+            print("inotify unavailable ({}), polling instead.".format(error))
+    return pollingWatcher(folder, interval)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def watchFolder(folder, ledgerPath=None, workers=None, settle=1.0, interval=1.0, stop=None, **options):
+    """Extracts IQTF data from each image written to a folder until stopped.
+
+    Parameters
+    ~~~~~~~~~~
+    folder : str
+        The folder to watch.
+    ledgerPath : str, optional
+        The CSV or JSONL file results are appended to; defaults to
+        iqtfResults.csv in the watched folder. Images already in the folder
+        are read when watching starts, unless they are in the ledger.
+    workers : int, optional
+        The number of worker processes; defaults to the number of CPUs.
+    settle : float, optional
+        Seconds an image's size must stay the same before it is read, when
+        the watcher can't tell that it has been fully written.
+    interval : float, optional
+        Seconds between scans of the folder when polling.
+    stop : threading.Event, optional
+        Stops watching when set; otherwise watches until interrupted.
+    options : optional
+        Keyword arguments passed on to extractIQTFdata.
+
+    """
+    if ledgerPath is None:
+        ledgerPath = os.path.join(folder, "iqtfResults.csv")
+    done = recordedImages(ledgerPath)
+    ledger = recordWriter(ledgerPath, append=True)
+    watcher = folderWatcher(folder, interval)
+    # path -> [fully written, (size, modification time), time it last changed]; images already
+    # in the folder are only reported by the watcher if they change, so queue the unread ones now
+    pending = {path: [False, None, None] for path in scanImages(folder) if path not in done}
+    running = {}
+
+    def finish(path, future):
+        """Appends a finished image's record to the ledger."""
+        try:
+            _, image_path, record, seconds = future.result()
+        except Exception as error:
+            print("Could not read {}: {}".format(os.path.basename(path), error))
+            return
+        ledger.write(record)
+        print("{:.2f} s  {}".format(seconds, formatRecord(record) or os.path.basename(image_path) + ": no data found"))
+
+    print("Watching {} (results in {}). Press Ctrl+C to stop.".format(folder, ledgerPath))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_startWorker) as pool:
+        try:
+            while stop is None or not stop.is_set():
+                # new images, and images written again under the same name
+                for path, complete in watcher.changes(0.25):
+                    entry = pending.setdefault(path, [False, None, None])
+                    entry[0] = entry[0] or complete
+                # debounce: read images once they are fully written or their size settles
+                now = time.monotonic()
+                for path, entry in list(pending.items()):
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        del pending[path] # removed before it could be read
+                        continue
+                    current = (stat.st_size, stat.st_mtime)
+                    if current != entry[1]:
+                        entry[1], entry[2] = current, now
+                    # an image changed while it is being read waits to be read again
+                    if path not in running and stat.st_size > 0 and (entry[0] or now - entry[2] >= settle):
+                        del pending[path]
+                        running[path] = pool.submit(_timedExtract, 0, path, options)
+                for path, future in list(running.items()):
+                    if future.done():
+                        del running[path]
+                        finish(path, future)
+        except KeyboardInterrupt:
+            print("Stopped watching {}.".format(folder))
+        finally:
+            watcher.close()
+            # keep the results of images already being read; the rest are read next time
+            try:
+                for path, future in running.items():
+                    finish(path, future)
+            finally:
+                ledger.close()
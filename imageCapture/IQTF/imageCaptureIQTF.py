@@ -11,12 +11,17 @@ Author: Dimitri Mojsejenko
 
 from tkinter import *
 from imageCapture import *
+from imagePreview import previewPanel
+from cameraDiscovery import eyeCameras
 
 class imageCaptureIQTF(Frame):
     """Image Capture IQTF GUI"""
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         Frame.__init__(self, parent)
+        # Find the scope's eyes (cached after the first run)
+        self.eyes = eyeCameras(webcam=False, default=(0, 1))
+
         # Scope Name
         row1 = Frame(self)
         lab1 = Label(row1, text="Scope Name: ")
@@ -55,20 +60,69 @@ class imageCaptureIQTF(Frame):
         fTypeChoice.pack(side=RIGHT)
         row4.pack()
 
+        # Frames to Average
+        row5 = Frame(self)
+        lab5 = Label(row5, text="Frames to average: ")
+        frames = Spinbox(row5, from_=1, to=32, width=5)
+        lab5.pack(side=LEFT, padx=3)
+        frames.pack(side=RIGHT)
+        row5.pack()
+
         # Message
         messageText = StringVar(self)
         message = Label(self, textvariable=messageText)
         message.pack(side=BOTTOM)
 
         # Capture Images
-        row5 = Frame(self)
-        capBut = Button(row5, text="Capture images", height=2, width=13)
-        capBut.bind('<Button>', lambda capButHandler: self.capImageIQTF(chosenTest.get(), scope.get(), run.get(), chosenFtype.get(), messageText))
+        row6 = Frame(self)
+        capBut = Button(row6, text="Capture images", height=2, width=13)
+        capBut.bind('<Button>', lambda capButHandler: self.capImageIQTF(chosenTest.get(), scope.get(), run.get(), chosenFtype.get(), frames.get(), messageText))
         capBut.pack()
-        row5.pack(side=BOTTOM, padx=2, pady=4)
+        row6.pack(side=BOTTOM, padx=2, pady=4)
+
+        # Live Preview
+        row7 = Frame(self)
+        rightView = previewPanel(row7, cameraIndex(self.eyes[0], webcam=False), "Right eye", previewWidth=240)
+        leftView = previewPanel(row7, cameraIndex(self.eyes[1], webcam=False), "Left eye", previewWidth=240)
+        self.previews = [rightView, leftView]
+        rightView.pack(side=LEFT, padx=2)
+        leftView.pack(side=RIGHT, padx=2)
+        showPreview = IntVar(self, value=1)
+        previewBut = Checkbutton(self, text="Live preview", variable=showPreview, command=lambda: self.togglePreview(showPreview.get()))
+        row7.pack(side=BOTTOM, padx=2, pady=2)
+        previewBut.pack(side=BOTTOM)
+        self.togglePreview(showPreview.get())
+
+        # Save captured images in the background
+        self.writer = getImageWriter()
+        self._pollWrites()
 
         self.pack(fill="both")
             
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def togglePreview(self, show):
+        """Starts/stops the live preview of both eyes."""
+        for preview in self.previews:
+            if show:
+                preview.start()
+            else:
+                preview.stop()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _pollWrites(self):
+        """Updates the message for images the background writer has finished saving."""
+        self.writer.dispatchCompleted()
+        self.after(100, self._pollWrites)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _imageSaved(self, msg_text, fname, result):
+        """Replaces the saving notice for the given image with the write result."""
+        if result:
+            done = "Image saved: " + fname
+        else:
+            done = "Failed to save image: " + fname
+        msg_text.set(msg_text.get().replace("Saving image: " + fname, done))
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def checkVars(self, scope, run, msg_text):
         """Checks the given values in the Entry fields."""
@@ -80,10 +134,14 @@ class imageCaptureIQTF(Frame):
         msg_text.set(msgText)
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def capImageIQTF(self, test, scope, run, ftype, msg_text):
+    def capImageIQTF(self, test, scope, run, ftype, frames, msg_text):
         """Captures images for selected test."""
         # 2 images total: left/right
         self.checkVars(scope, run, msg_text)
+        try:
+            frames = max(1, int(frames))
+        except ValueError:
+            frames = 1
         if test == "Uniformity":
             name = "Uniformity_"
         else:
@@ -105,17 +163,12 @@ class imageCaptureIQTF(Frame):
                 fileExt = "jpg"
                 fcomp = [cv2.IMWRITE_JPEG_QUALITY, 90]
         
-        for cam in range(0, 2):
-            if cam == 0:
-                rname = name + "right." + fileExt
-                msgText += captureImage(cam, rname, fcomp, webcam=False)
-            else:
-                lname = name + "left." + fileExt
-                msgText += captureImage(cam, lname, fcomp, webcam=False)
+        # right and left eyes captured together
+        rname = name + "right." + fileExt
+        lname = name + "left." + fileExt
+        onSaved = lambda fname, result: self._imageSaved(msg_text, fname, result)
+        msgText += captureStereo(*self.eyes, rname, lname, fcomp, webcam=False, writer=self.writer, onSaved=onSaved, frames=frames, display=False)
         msg_text.set(msgText)
-        # keep images displayed till any key press
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
             
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 if __name__ == "__main__":
@@ -128,8 +181,8 @@ if __name__ == "__main__":
     ws = root.winfo_screenwidth()
     hs = root.winfo_screenheight()
     # set GUI window width and height
-    w = 350
-    h = 230
+    w = 520
+    h = 490
     # set GUI window location to center of screen
     x = (ws/2) - (w/2)
     y = (hs/2) - (h/2)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+""" Burst Capture Benchmark
+
+This script measures how many 1920x1080 frames per second the burst
+capture can combine into a single averaged frame. Synthetic noisy frames
+are used by default so it can run without a camera; give a camera index
+to also measure the capture rate of a connected camera.
+
+Author: Dimitri Mojsejenko
+"""
+import time
+import argparse
+import numpy as np
+from imageCapture import averageFrames
+from cameraPool import cameraPool
+
+def benchmarkAverage(frames, method, repeat, float32=False, width=1920, height=1080):
+    """Returns the frames/sec combined by averageFrames for synthetic frames."""
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 256, size=(frames, height, width, 3), dtype=np.uint8)
+    averageFrames(stack, method, float32) # warm up
+    start = time.perf_counter()
+    for i in range(repeat):
+        averageFrames(stack, method, float32)
+    elapsed = time.perf_counter() - start
+    return frames * repeat / elapsed
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def benchmarkCapture(camNum, frames, repeat, width=1920, height=1080):
+    """Returns the frames/sec captured in bursts from the given camera."""
+    pool = cameraPool()
+    results, images, skew = pool.captureSynced([camNum], width, height, frames) # opens and warms
+    if not results[0]:
+        pool.closeAll()
+        return None
+    start = time.perf_counter()
+    for i in range(repeat):
+        pool.captureSynced([camNum], width, height, frames)
+    elapsed = time.perf_counter() - start
+    pool.closeAll()
+    return frames * repeat / elapsed
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-n", "--frames",
+        type=int,
+        default=8,
+        help="The number of frames per burst"
+    )
+    argParser.add_argument(
+        "-r", "--repeat",
+        type=int,
+        default=5,
+        help="The number of bursts to time"
+    )
+    argParser.add_argument(
+        "-c", "--camera",
+        type=int,
+        help="The index of a camera to also benchmark capturing from"
+    )
+    args = argParser.parse_args()
+
+    print("Combining {} frames at 1920x1080, {} bursts:".format(args.frames, args.repeat))
+    for method, float32 in [("mean", False), ("mean", True), ("median", False)]:
+        fps = benchmarkAverage(args.frames, method, args.repeat, float32)
+        label = method + (" (float32)" if float32 else "")
+        print("  {:<15} {:8.1f} frames/sec".format(label, fps))
+    if args.camera is not None:
+        fps = benchmarkCapture(args.camera, args.frames, args.repeat)
+        if fps is None:
+            print("Failed to capture from camera {}.".format(args.camera))
+        else:
+            print("  {:<15} {:8.1f} frames/sec (camera {})".format("capture", fps, args.camera))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
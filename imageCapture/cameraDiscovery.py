@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+""" Camera Discovery
+
+This module finds the connected cameras, records the resolutions they
+support and how long they take to open, and caches the result on disk. The
+cache is reused until the set of connected devices changes, so the capture
+GUIs can tell which cameras are the scope's left and right eyes without
+opening every camera each time they start.
+
+Run as a script to list the connected cameras.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+import sys
+import cv2
+import time
+import json
+import glob
+import argparse
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import cacheFolder
+
+# resolutions to probe each camera with, as (width, height)
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+CACHE_PATH = os.path.join(cacheFolder(), "cameras.json")
+# Windows device interface class for video capture devices (KSCATEGORY_CAPTURE)
+_CAPTURE_CLASS = r"SYSTEM\CurrentControlSet\Control\DeviceClasses\{65E8773D-8F56-11D0-A3B9-00A0C9223196}"
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def deviceFingerprint():
+    """Returns a cheap identifier of the connected video devices, without opening them.
+
+    Returns
+    ~~~~~~~
+    fingerprint : list or None
+        Sorted names of the connected video devices, or None if they can't
+        be listed on this system.
+
+    """
+    if os.name == "nt":
+        try:
+            import winreg
+        except ImportError:
+            return None
+        devices = []
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, _CAPTURE_CLASS) as classKey:
+                i = 0
+                while True:
+                    try:
+                        name = winreg.EnumKey(classKey, i)
+                    except OSError:
+                        break
+                    i += 1
+                    # interfaces stay registered after unplugging; "Linked" is 1 while present
+                    try:
+                        with winreg.OpenKey(classKey, name + r"\#\Control") as control:
+                            linked = winreg.QueryValueEx(control, "Linked")[0]
+                    except OSError:
+                        linked = 0
+                    if linked:
+                        devices.append(name)
+        except OSError:
+            return None
+        return sorted(devices)
+    if sys.platform.startswith("linux"):
+        return sorted(glob.glob("/dev/video*"))
+    return None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def probeCamera(camNum, backend=cv2.CAP_DSHOW, resolutions=RESOLUTIONS):
+    """Opens a camera and records its open latency and supported resolutions.
+
+    Returns
+    ~~~~~~~
+    camera : dict or None
+        The camera's index, open time (seconds) and supported resolutions,
+        or None if no camera could be opened at that index.
+
+    """
+    start = time.perf_counter()
+    cam = cv2.VideoCapture(camNum, backend)
+    if not cam.isOpened():
+        cam.release()
+        return None
+    openSeconds = time.perf_counter() - start
+    supported = []
+    for (width, height) in resolutions:
+        cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        # the driver settles on the closest mode it supports
+        actual = [int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))]
+        if actual == [width, height] and actual not in supported:
+            supported.append(actual)
+    cam.release()
+    return {"index": camNum, "openSeconds": round(openSeconds, 3), "resolutions": supported}
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def discoverCameras(maxIndex=8, backend=cv2.CAP_DSHOW):
+    """Probes camera indices in order until two in a row fail to open.
+
+    Returns
+    ~~~~~~~
+    cameras : list
+        A dict per camera found, as returned by probeCamera.
+
+    """
+    cameras = []
+    misses = 0
+    for camNum in range(maxIndex):
+        camera = probeCamera(camNum, backend)
+        if camera is None:
+            misses += 1
+            if misses >= 2:
+                break
+        else:
+            misses = 0
+            cameras.append(camera)
+    return cameras
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def getCameras(refresh=False, maxAge=7*24*3600, cachePath=CACHE_PATH):
+    """Returns the connected cameras, from the cache when it is still valid.
+
+    The cache is invalid when the connected devices have changed, or, when
+    the devices can't be listed on this system, once it is older than maxAge.
+
+    Parameters
+    ~~~~~~~~~~
+    refresh : bool, optional
+        Ignores the cache and probes the cameras again.
+    maxAge : float, optional
+        Seconds a cache without a device fingerprint stays valid.
+    cachePath : str, optional
+        The path of the cache file.
+
+    Returns
+    ~~~~~~~
+    cameras : list
+        A dict per camera found, as returned by probeCamera.
+
+    """
+    fingerprint = deviceFingerprint()
+    if not refresh:
+        try:
+            with open(cachePath, 'r') as f:
+                cache = json.load(f)
+            if fingerprint is not None:
+                valid = cache["fingerprint"] == fingerprint
+            else:
+                valid = time.time() - cache["time"] < maxAge
+            if valid:
+                return cache["cameras"]
+        except (OSError, ValueError, KeyError):
+            pass
+    cameras = discoverCameras()
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(cachePath, 'w') as f:
+            json.dump({"fingerprint": fingerprint, "time": time.time(), "cameras": cameras}, f, indent=2)
+    except OSError as error:
+        print("Could not save camera cache: {}".format(error))
+    return cameras
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def eyeCameras(webcam=True, default=(1, 2), width=1920, height=1080):
+    """Finds which cameras are the scope's right and left eyes.
+
+    The scope eyes are taken to be the first two cameras supporting the
+    capture resolution, skipping the webcam, with the right eye first.
+
+    Parameters
+    ~~~~~~~~~~
+    webcam : bool, optional
+        True when webcam is connected.
+    default : tuple, optional
+        The (right, left) camera numbers to use if two eyes aren't found.
+    width : int, optional
+        The frame width the eyes need to support.
+    height : int, optional
+        The frame height the eyes need to support.
+
+    Returns
+    ~~~~~~~
+    eyes : tuple
+        The (right, left) camera numbers, counted the same way as the camNum
+        given to captureImage.
+
+    """
+    offset = 1 if webcam else 0 # captureImage skips the webcam at index 0
+    eyes = [c["index"] - offset for c in getCameras()
+            if c["index"] >= offset and [width, height] in c["resolutions"]]
+    if len(eyes) < 2:
+        return default
+    return eyes[0], eyes[1]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def main():
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument(
+        "-r", "--refresh",
+        action="store_true",
+        help="Probe the cameras again instead of using the cache"
+    )
+    args = argParser.parse_args()
+    cameras = getCameras(refresh=args.refresh)
+    if not cameras:
+        print("No cameras found.")
+    for camera in cameras:
+        resolutions = ', '.join("{}x{}".format(w, h) for w, h in camera["resolutions"])
+        print("Camera {}: opens in {:.2f} s, supports {}".format(camera["index"], camera["openSeconds"], resolutions or "unknown"))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+if __name__ == '__main__':
+    main()
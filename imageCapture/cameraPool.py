@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+""" Camera Pool
+
+This module keeps connected cameras open between captures so that each
+capture only costs a single frame grab, instead of a full device open,
+resolution change, and auto-exposure settle. Cameras are released after
+sitting idle for a while, or when the program exits.
+
+Author: Dimitri Mojsejenko
+"""
+import cv2
+import time
+import numpy as np
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class cameraSession:
+    """An open camera device at a fixed resolution."""
+    def __init__(self, camNum, width, height, backend):
+        self.camNum = camNum
+        self.width = width
+        self.height = height
+        self.lock = threading.Lock() # one reader at a time per device
+        self.lastUsed = time.monotonic()
+        self.warm = False
+        self.cam = cv2.VideoCapture(camNum, backend)
+        if self.cam.isOpened():
+            # resize from default 640x480
+            self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            # keep as few frames as possible queued so reads are not stale
+            self.cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def isOpened(self):
+        return self.cam.isOpened()
+
+    def read(self):
+        """Reads one frame from the device."""
+        with self.lock:
+            self.lastUsed = time.monotonic()
+            return self.cam.read()
+
+    def grab(self):
+        """Grabs a frame without decoding it; caller must hold the lock.
+
+        Returns the result and the time the grab completed.
+        """
+        self.lastUsed = time.monotonic()
+        result = self.cam.grab()
+        return result, time.perf_counter()
+
+    def retrieve(self):
+        """Decodes the last grabbed frame; caller must hold the lock."""
+        return self.cam.retrieve()
+
+    def retrieveInto(self, stack, i):
+        """Decodes the last grabbed frame into stack[i]; caller must hold the lock."""
+        result, image = self.cam.retrieve(stack[i])
+        if result and image.shape != stack.shape[1:]:
+            return False, None # resolution changed mid-burst
+        if result and image.ctypes.data != stack[i].ctypes.data:
+            stack[i] = image # OpenCV decoded into a new buffer
+        return result, stack[i]
+
+    def release(self):
+        with self.lock:
+            self.cam.release()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class cameraPool:
+    """Pool of open camera sessions keyed by camera index and resolution.
+
+    Parameters
+    ~~~~~~~~~~
+    idleTimeout : float, optional
+        Seconds a camera may sit unused before it is released.
+    backend : int, optional
+        The OpenCV video capture API to open cameras with.
+
+    """
+    def __init__(self, idleTimeout=300.0, backend=cv2.CAP_DSHOW):
+        self.idleTimeout = idleTimeout
+        self.backend = backend
+        self._sessions = {} # (camNum, width, height) -> cameraSession
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = None
+        self._grabbers = None # worker threads for synchronized grabs
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def openCamera(self, camNum, width=1920, height=1080):
+        """Returns an open session for the given camera, opening it if needed.
+
+        Parameters
+        ~~~~~~~~~~
+        camNum : int
+            The index of the camera; starts at 0.
+        width : int, optional
+            The frame width to capture at.
+        height : int, optional
+            The frame height to capture at.
+
+        Returns
+        ~~~~~~~
+        session : cameraSession or None
+            The open session, or None if the camera could not be opened.
+
+        """
+        key = (camNum, width, height)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            # a device can only be open once, so drop it at any other resolution
+            for other in [k for k in self._sessions if k[0] == camNum]:
+                self._sessions.pop(other).release()
+            session = cameraSession(camNum, width, height, self.backend)
+            if not session.isOpened():
+                session.release()
+                return None
+            self._sessions[key] = session
+            self._startReaper()
+            return session
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def warmCamera(self, camNum, width=1920, height=1080, frames=10):
+        """Opens a camera and reads a few frames to let auto-exposure settle.
+
+        Returns
+        ~~~~~~~
+        result : bool
+            True if the camera is open and delivering frames.
+
+        """
+        session = self.openCamera(camNum, width, height)
+        if session is None:
+            return False
+        result = False
+        for i in range(frames):
+            result, image = session.read()
+        session.warm = result
+        return result
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def capture(self, camNum, width=1920, height=1080):
+        """Captures a frame from the given camera.
+
+        Returns
+        ~~~~~~~
+        result : bool
+            True if a frame was captured.
+        image : numpy.ndarray or None
+            The captured frame.
+
+        """
+        session = self.openCamera(camNum, width, height)
+        if session is None:
+            return False, None
+        if not session.warm:
+            self.warmCamera(camNum, width, height)
+        result, image = session.read()
+        if not result:
+            # device may have been unplugged, so reopen on the next capture
+            self.closeCamera(camNum)
+        return result, image
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def captureSynced(self, camNums, width=1920, height=1080, frames=1):
+        """Captures frames from each of the given cameras at the same time.
+
+        Every camera is grabbed concurrently from its own worker thread, and 
+        only once all grabs are done are the frames retrieved (decoded). For 
+        a burst of frames, each camera's frames are decoded straight into a 
+        preallocated stack.
+
+        Parameters
+        ~~~~~~~~~~
+        camNums : list
+            The indices of the cameras to capture from.
+        width : int, optional
+            The frame width to capture at.
+        height : int, optional
+            The frame height to capture at.
+        frames : int, optional
+            The number of frames to capture from each camera.
+
+        Returns
+        ~~~~~~~
+        results : list
+            True for each camera all frames were captured from.
+        images : list
+            The captured frames, or None where the capture failed. When 
+            frames > 1, each is a (frames, height, width, channels) stack.
+        skew : float
+            Seconds between the first and last completed grab of the first frame.
+
+        """
+        if self._grabbers is None:
+            self._grabbers = ThreadPoolExecutor(max_workers=max(2, len(camNums)), thread_name_prefix="grab")
+        sessions = [self.openCamera(camNum, width, height) for camNum in camNums]
+        opened = [s for s in sessions if s is not None]
+        # let any newly opened cameras settle in parallel too
+        cold = [s.camNum for s in opened if not s.warm]
+        list(self._grabbers.map(lambda camNum: self.warmCamera(camNum, width, height), cold))
+
+        # lock in a fixed order so two synced captures can't deadlock
+        locked = sorted(set(opened), key=lambda s: s.camNum)
+        for session in locked:
+            session.lock.acquire()
+        try:
+            grabs = list(self._grabbers.map(lambda s: s.grab() if s else (False, None), sessions))
+            decoded = list(self._grabbers.map(lambda s, g: s.retrieve() if s and g[0] else (False, None), sessions, grabs))
+            results = [d[0] for d in decoded]
+            images = [d[1] if d[0] else None for d in decoded]
+            if frames > 1:
+                # size the stacks from the first frame, as the camera may not support the requested resolution
+                images = [self._newStack(image, frames) for image in images]
+                for i in range(1, frames):
+                    burst = list(self._grabbers.map(lambda s, r: s.grab() if s and r else (False, None), sessions, results))
+                    decoded = list(self._grabbers.map(lambda s, g, stack: s.retrieveInto(stack, i) if g[0] else (False, None), sessions, burst, images))
+                    results = [d[0] for d in decoded]
+        finally:
+            for session in locked:
+                session.lock.release()
+
+        images = [image if result else None for result, image in zip(results, images)]
+        times = [g[1] for g in grabs if g[0]]
+        skew = max(times) - min(times) if times else 0.0
+        for camNum, result in zip(camNums, results):
+            if not result:
+                self.closeCamera(camNum)
+        return results, images, skew
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def closeCamera(self, camNum):
+        """Releases the given camera at any resolution."""
+        with self._lock:
+            for key in [k for k in self._sessions if k[0] == camNum]:
+                self._sessions.pop(key).release()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def closeAll(self):
+        """Releases every open camera and stops the idle reaper."""
+        self._stop.set()
+        with self._lock:
+            while self._sessions:
+                self._sessions.popitem()[1].release()
+        if self._grabbers is not None:
+            self._grabbers.shutdown(wait=False)
+            self._grabbers = None
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _newStack(self, image, frames):
+        """Returns a stack for a burst of frames holding the given first frame."""
+        if image is None:
+            return None
+        stack = np.empty((frames,) + image.shape, dtype=image.dtype)
+        stack[0] = image
+        return stack
+
+    def _startReaper(self):
+        """Starts the background thread that releases idle cameras."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reapIdle, daemon=True)
+        self._reaper.start()
+
+    def _reapIdle(self):
+        interval = max(1.0, self.idleTimeout / 10)
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                for key, session in list(self._sessions.items()):
+                    if now - session.lastUsed > self.idleTimeout:
+                        self._sessions.pop(key).release()
+                if not self._sessions:
+                    self._reaper = None
+                    return
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+_defaultPool = None
+_defaultLock = threading.Lock()
+
+def getCameraPool():
+    """Returns the camera pool shared by the whole program."""
+    global _defaultPool
+    with _defaultLock:
+        if _defaultPool is None:
+            _defaultPool = cameraPool()
+            atexit.register(_defaultPool.closeAll)
+        return _defaultPool
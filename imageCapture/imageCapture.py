@@ -3,15 +3,24 @@
 
 This module provides functions to capture images and save them in the user's 
 Camera Roll folder. The images are also displayed and a notification 
-message is returned.
+message is returned. Cameras are kept open between captures by the 
+camera pool, so repeated captures only pay for a single frame grab.
+Images can be handed to an image writer to be saved in the background.
 CaptureImage must be run in a Windows shell.
 
 Author: Dimitri Mojsejenko
 """
+import os
+import sys
 import cv2
-import subprocess
+import numpy as np
 from os.path import isfile
 import ctypes
+commonPath = os.path.join(os.path.dirname(__file__), '..', 'common')
+sys.path.append(commonPath)
+from userPaths import cameraRollFolder
+from cameraPool import getCameraPool
+from imageWriter import getImageWriter
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def resizeImage(image, width=None, height=None):
@@ -29,61 +38,86 @@ def resizeImage(image, width=None, height=None):
     return cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def captureImage(camNum, fname, fcomp=[cv2.IMWRITE_JPEG_QUALITY, 90], webcam=True):
-    """Captures an image from a selected camera.
+def averageFrames(stack, method="mean", float32=False):
+    """Combines a burst of frames into a single low-noise frame.
     
     Parameters
     ~~~~~~~~~~
-    camNum : int
-        The index of the camera; starts at 0.
-    fname : str
-        The filename to save the image as.
-    fcomp : list, optional
-        The image compression settings.
-    webcam: bool, optional
-        True when webcam is connected.
+    stack : numpy.ndarray
+        The frames to combine, shaped (frames, height, width, channels).
+    method : str, optional
+        "mean" to average the frames, or "median" to take the per-pixel median.
+    float32 : bool, optional
+        Average in float32 instead of summing 8-bit frames in 16-bit integers.
 
     Returns
     ~~~~~~~
-    msgText : str
-        The notification message text.
+    image : numpy.ndarray
+        The combined frame, with the same dtype as the stack.
 
     """
+    frames = stack.shape[0]
+    if method == "median":
+        combined = np.median(stack, axis=0)
+    elif float32 or stack.dtype != np.uint8 or frames > 257:
+        combined = stack.mean(axis=0, dtype=np.float32)
+    else:
+        # a uint16 sum of up to 257 8-bit frames can't overflow; round half up
+        total = stack.sum(axis=0, dtype=np.uint16)
+        return ((total + frames // 2) // frames).astype(np.uint8)
+    # round and clip so the result can't wrap around when converted back
+    info = np.iinfo(stack.dtype)
+    return np.clip(np.rint(combined), info.min, info.max).astype(stack.dtype)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def cameraIndex(camNum, webcam=True):
+    """Returns the device index that captureImage uses for the given camera number."""
+    if webcam:
+        # adjust camNum to skip index of webcam (0)
+        return camNum + 1
+    return camNum
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _captureSettings(camNum, webcam):
+    """Returns the camera index, save folder and display window location for a capture."""
     # get the path to the user's Camera Roll folder
+    cameraRoll = cameraRollFolder(webcam)
     if webcam: # laptop
-        user = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-        cameraRoll = "C:\\Users\\" + user + "\\OneDrive - JNJ\\Pictures\\Camera Roll\\"
         # image window placement (laptop)
         x_left = 230
         x_right = 1190
-        y = 220
-        # adjust camNum to skip index of webcam (0)
-        camNum = camNum + 1
     else: # no webcam == PC
-        cameraRoll = "C:\\Users\\User\\Pictures\\Camera Roll\\"
         # image window placement (PC)
         x_left = 90
         x_right = 690
-    fpath = cameraRoll + fname
-    
-    # capture image
-    cam = cv2.VideoCapture(camNum, cv2.CAP_DSHOW)
+    y = 220
+    camNum = cameraIndex(camNum, webcam)
+    if camNum == 2 or (not webcam and camNum == 1): # left eye
+        windowPos = (x_left, y)
+    else: # right eye
+        windowPos = (x_right, y)
+    return camNum, cameraRoll, windowPos
 
-    # resize from default 640x480 to 1920x1080
-    cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-    cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-    result, image = cam.read()
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _saveImage(image, fname, fpath, fcomp, windowPos, writer=None, onSaved=None, display=True):
+    """Saves and displays a captured image, and returns the notification message."""
     msgText = ''
-    if result:
-        # check if file already exists
-        resp = 1
-        if isfile(fpath):
-            fileMsg = "File already exists at: \n"+fpath+"\n\nOkay to overwrite?"
-            resp = ctypes.windll.user32.MessageBoxW(0, fileMsg, "File Check", 1)
-        if not resp == 2: # 2 = cancel
-            # default JPG quality of Windows Camera App is around 90
+    # check if file already exists (or is about to)
+    resp = 1
+    if isfile(fpath) or (writer is not None and writer.isPending(fpath)):
+        fileMsg = "File already exists at: \n"+fpath+"\n\nOkay to overwrite?"
+        resp = ctypes.windll.user32.MessageBoxW(0, fileMsg, "File Check", 1)
+    if not resp == 2: # 2 = cancel
+        # default JPG quality of Windows Camera App is around 90
+        if writer is not None:
+            callback = None
+            if onSaved is not None:
+                callback = lambda path, result: onSaved(fname, result)
+            writer.submit(fpath, image, fcomp, callback)
+        else:
             cv2.imwrite(fpath, image, fcomp)
-            
+        
+        if display:
             # resize displayed image
             imageResized = resizeImage(image, width=500) # width=500 height=281
             
@@ -92,13 +126,106 @@ def captureImage(camNum, fname, fcomp=[cv2.IMWRITE_JPEG_QUALITY, 90], webcam=Tru
             #    - laptop screen size: width=1280 height=720
             #    - PC screen size: width=1920 height=1080
             cv2.namedWindow(fname)
-
-            if camNum == 2 or (not webcam and camNum == 1): # left eye
-                cv2.moveWindow(fname, x_left, y)
-            else: # right eye
-                cv2.moveWindow(fname, x_right, y)
+            cv2.moveWindow(fname, *windowPos)
             cv2.imshow(fname, imageResized)
+        if writer is not None:
+            msgText = "Saving image: " + fname + '\n'
+        else:
             msgText = "Image saved: " + fname + '\n'
+    return msgText
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def captureImage(camNum, fname, fcomp=[cv2.IMWRITE_JPEG_QUALITY, 90], webcam=True, writer=None, onSaved=None, display=True):
+    """Captures an image from a selected camera.
+    
+    Parameters
+    ~~~~~~~~~~
+    camNum : int
+        The index of the camera; starts at 0.
+    fname : str
+        The filename to save the image as.
+    fcomp : list, optional
+        The image compression settings.
+    webcam: bool, optional
+        True when webcam is connected.
+    writer : imageWriter, optional
+        Saves the image in the background instead of before returning.
+    onSaved : function, optional
+        Called as onSaved(fname, result) once the writer has saved the image.
+    display : bool, optional
+        Shows the captured image in a pop-up window.
+
+    Returns
+    ~~~~~~~
+    msgText : str
+        The notification message text.
+
+    """
+    camNum, cameraRoll, windowPos = _captureSettings(camNum, webcam)
+    fpath = cameraRoll + fname
+    
+    # capture image at 1920x1080 from the already open camera (if any)
+    result, image = getCameraPool().capture(camNum, 1920, 1080)
+    if result:
+        msgText = _saveImage(image, fname, fpath, fcomp, windowPos, writer, onSaved, display)
     else:
         msgText = "Failed to capture image.\n"
+    return msgText
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def captureStereo(rightCam, leftCam, rname, lname, fcomp=[cv2.IMWRITE_JPEG_QUALITY, 90], webcam=True, writer=None, onSaved=None, frames=1, method="mean", display=True):
+    """Captures images from the right and left eyes at the same time.
+    
+    Both cameras are triggered together from worker threads, so the pair of 
+    images is time-consistent and takes about as long as a single capture. 
+    With more than one frame, a burst is captured from each eye and combined 
+    into a single image to reduce sensor noise.
+    
+    Parameters
+    ~~~~~~~~~~
+    rightCam : int
+        The index of the right eye camera; starts at 0.
+    leftCam : int
+        The index of the left eye camera; starts at 0.
+    rname : str
+        The filename to save the right eye image as.
+    lname : str
+        The filename to save the left eye image as.
+    fcomp : list, optional
+        The image compression settings.
+    webcam: bool, optional
+        True when webcam is connected.
+    writer : imageWriter, optional
+        Saves the image in the background instead of before returning.
+    onSaved : function, optional
+        Called as onSaved(fname, result) once the writer has saved the image.
+    frames : int, optional
+        The number of frames to capture and combine for each eye.
+    method : str, optional
+        How to combine the frames: "mean" or "median".
+    display : bool, optional
+        Shows the captured images in pop-up windows.
+
+    Returns
+    ~~~~~~~
+    msgText : str
+        The notification message text.
+
+    """
+    rightNum, cameraRoll, rightPos = _captureSettings(rightCam, webcam)
+    leftNum, cameraRoll, leftPos = _captureSettings(leftCam, webcam)
+    
+    results, images, skew = getCameraPool().captureSynced([rightNum, leftNum], 1920, 1080, frames)
+    if frames > 1:
+        images = [averageFrames(stack, method) if stack is not None else None for stack in images]
+    msgText = ''
+    for result, image, fname, windowPos in zip(results, images, [rname, lname], [rightPos, leftPos]):
+        if result:
+            msgText += _saveImage(image, fname, cameraRoll + fname, fcomp, windowPos, writer, onSaved, display)
+        else:
+            msgText += "Failed to capture image.\n"
+    if all(results):
+        if frames > 1:
+            msgText += "Combined {} frames per eye ({}).\n".format(frames, method)
+        msgText += "Left/right frame skew: {:.1f} ms\n".format(skew * 1000)
     return msgText
\ No newline at end of file
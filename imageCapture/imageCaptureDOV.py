@@ -15,16 +15,22 @@ from tkinter import *
 imageCapturePath = os.path.join(os.path.dirname(__file__), '..', 'imageCapture')
 sys.path.append(imageCapturePath)
 from imageCapture import *
+from imagePreview import previewPanel
+from cameraDiscovery import eyeCameras
 
 # camera 0 = webcam
 # camera 1 = right eye of scope
 # camera 2 = left eye of scope
+# (unless camera discovery finds the eyes elsewhere)
 
 class imageCaptureDOV(Frame):
     """Image Capture GUI"""
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         Frame.__init__(self, parent)
+        # Find the scope's eyes (cached after the first run)
+        self.eyes = eyeCameras(webcam=True, default=(1, 2))
+
         # Scope Name
         row1 = Frame(self)
         lab1 = Label(row1, text="Scope Name: ")
@@ -75,6 +81,23 @@ class imageCaptureDOV(Frame):
         capBut.pack()
         row5.pack(side=BOTTOM, padx=2, pady=2)
 
+        # Live Preview
+        row6 = Frame(self)
+        rightView = previewPanel(row6, cameraIndex(self.eyes[0], webcam=True), "Right eye", previewWidth=240)
+        leftView = previewPanel(row6, cameraIndex(self.eyes[1], webcam=True), "Left eye", previewWidth=240)
+        self.previews = [rightView, leftView]
+        rightView.pack(side=LEFT, padx=2)
+        leftView.pack(side=RIGHT, padx=2)
+        showPreview = IntVar(self, value=1)
+        previewBut = Checkbutton(self, text="Live preview", variable=showPreview, command=lambda: self.togglePreview(showPreview.get()))
+        row6.pack(side=BOTTOM, padx=2, pady=2)
+        previewBut.pack(side=BOTTOM)
+        self.togglePreview(showPreview.get())
+
+        # Save captured images in the background
+        self.writer = getImageWriter()
+        self._pollWrites()
+
         self.pack(fill="both")
     
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -85,6 +108,30 @@ class imageCaptureDOV(Frame):
         else:
             frame.pack_forget()
             
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def togglePreview(self, show):
+        """Starts/stops the live preview of both eyes."""
+        for preview in self.previews:
+            if show:
+                preview.start()
+            else:
+                preview.stop()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _pollWrites(self):
+        """Updates the message for images the background writer has finished saving."""
+        self.writer.dispatchCompleted()
+        self.after(100, self._pollWrites)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _imageSaved(self, msg_text, fname, result):
+        """Replaces the saving notice for the given image with the write result."""
+        if result:
+            done = "Image saved: " + fname
+        else:
+            done = "Failed to save image: " + fname
+        msg_text.set(msg_text.get().replace("Saving image: " + fname, done))
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def checkVars(self, scope, trial, msg_text):
         """Checks the given values in the Entry fields."""
@@ -103,9 +150,6 @@ class imageCaptureDOV(Frame):
             self.capImageColorAcc(scope, trial, msg_text)
         else:
             self.capImageDOV(scope, dist, trial, msg_text)
-        # keep images displayed till any key press
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~     
     def capImageDOV(self, scope, dist, trial, msg_text):
@@ -118,13 +162,9 @@ class imageCaptureDOV(Frame):
         if trial:
             name += "trial" + trial + "_"
         msgText = msg_text.get()
-        for cam in range(1, 3):
-            if cam == 1:
-                rname = name + "right.jpg"
-                msgText += captureImage(cam, rname)
-            else:
-                lname = name + "left.jpg"
-                msgText += captureImage(cam, lname)
+        # right and left eyes captured together
+        onSaved = lambda fname, result: self._imageSaved(msg_text, fname, result)
+        msgText += captureStereo(*self.eyes, name + "right.jpg", name + "left.jpg", writer=self.writer, onSaved=onSaved, display=False)
         msg_text.set(msgText)
 
         #DEBUGGING:
@@ -142,13 +182,9 @@ class imageCaptureDOV(Frame):
         if trial:
             name += "trial" + trial + "_"
         msgText = msg_text.get()
-        for cam in range(1, 3):
-            if cam == 1:
-                rname = name + "right.jpg"
-                msgText += captureImage(cam, rname)
-            else:
-                lname = name + "left.jpg"
-                msgText += captureImage(cam, lname)
+        # right and left eyes captured together
+        onSaved = lambda fname, result: self._imageSaved(msg_text, fname, result)
+        msgText += captureStereo(*self.eyes, name + "right.jpg", name + "left.jpg", writer=self.writer, onSaved=onSaved, display=False)
         msg_text.set(msgText)
             
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -162,8 +198,8 @@ if __name__ == "__main__":
     ws = root.winfo_screenwidth()
     hs = root.winfo_screenheight()
     # set GUI window width and height
-    w = 350
-    h = 250
+    w = 520
+    h = 480
     # set GUI window location to center of screen
     x = (ws/2) - (w/2)
     y = (hs/2) - (h/2)
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+""" Image Preview
+
+This module provides a live, downscaled camera preview that can be placed
+in a Tkinter GUI. A background thread grabs frames from the camera pool and
+keeps only the newest one, and the GUI draws it from its own event loop, so
+focusing and aligning can be done before capturing without the GUI blocking.
+
+Author: Dimitri Mojsejenko
+"""
+import cv2
+import time
+import threading
+from tkinter import *
+from cameraPool import getCameraPool
+from imageCapture import resizeImage
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class frameGrabber:
+    """Background thread that keeps the latest downscaled frame from a camera.
+
+    Parameters
+    ~~~~~~~~~~
+    camNum : int
+        The index of the camera; starts at 0.
+    previewWidth : int, optional
+        The width to downscale preview frames to.
+    fps : float, optional
+        The most frames per second to grab, which bounds the CPU used.
+    width : int, optional
+        The frame width the camera is opened at.
+    height : int, optional
+        The frame height the camera is opened at.
+
+    """
+    def __init__(self, camNum, previewWidth=320, fps=15, width=1920, height=1080):
+        self.camNum = camNum
+        self.previewWidth = previewWidth
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self._latest = (0, None) # single slot: (frame number, frame)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._grab, name="preview"+str(self.camNum), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self):
+        """Returns the newest frame number and frame (None until the first grab)."""
+        with self._lock:
+            return self._latest
+
+    def _grab(self):
+        pool = getCameraPool()
+        period = 1.0 / self.fps
+        count = 0
+        while not self._stop.is_set():
+            start = time.monotonic()
+            session = pool.openCamera(self.camNum, self.width, self.height)
+            if session is None:
+                # camera not connected (yet); try again shortly
+                self._stop.wait(1.0)
+                continue
+            result, image = session.read()
+            if result:
+                count += 1
+                if count >= 10:
+                    session.warm = True # auto-exposure has settled by now
+                small = resizeImage(image, width=self.previewWidth)
+                with self._lock:
+                    self._latest = (count, small) # drop whatever wasn't drawn yet
+            self._stop.wait(max(0.0, period - (time.monotonic() - start)))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class previewPanel(Frame):
+    """Live camera preview GUI widget"""
+    def __init__(self, parent, camNum, title="", previewWidth=320, fps=15, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.grabber = frameGrabber(camNum, previewWidth, fps)
+        self.period = int(1000 / fps)
+        self._shown = 0
+        self._job = None
+        if title:
+            Label(self, text=title).pack(side=TOP)
+        # blank until the first frame arrives
+        self._photo = PhotoImage(master=self, width=previewWidth, height=int(previewWidth * 9 / 16))
+        self.view = Label(self, image=self._photo, bg="black")
+        self.view.pack(side=TOP)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def start(self):
+        """Starts grabbing and drawing frames."""
+        self.grabber.start()
+        if self._job is None:
+            self._refresh()
+
+    def stop(self):
+        """Stops grabbing and drawing frames, leaving the camera open for captures."""
+        self.grabber.stop()
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _refresh(self):
+        """Draws the newest frame, if there is one, and schedules the next draw."""
+        count, frame = self.grabber.latest()
+        if frame is not None and count != self._shown:
+            self._shown = count
+            # Tk reads binary PPM natively, so no extra imaging library is needed
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            (h, w) = rgb.shape[:2]
+            ppm = b"P6 %d %d 255 " % (w, h) + rgb.tobytes()
+            self._photo = PhotoImage(master=self, data=ppm, format="PPM")
+            self.view.configure(image=self._photo)
+        self._job = self.after(self.period, self._refresh)
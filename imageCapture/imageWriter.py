@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+""" Image Writer
+
+This module encodes and saves captured images in the background, so that
+slow encodes (such as PNG at full compression) don't freeze the GUI.
+Writes are queued up to a set limit; once the queue is full, new writes
+wait for room. Any queued writes are finished before the program exits.
+
+Author: Dimitri Mojsejenko
+"""
+import cv2
+import queue
+import atexit
+import threading
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+class imageWriter:
+    """Background image encode-and-write stage.
+
+    cv2.imwrite releases the GIL while encoding, so a few worker threads
+    encode in parallel without the cost of copying frames to other processes.
+
+    Parameters
+    ~~~~~~~~~~
+    maxQueued : int, optional
+        The number of images that may wait to be written before submit blocks.
+    workers : int, optional
+        The number of writer threads.
+
+    """
+    def __init__(self, maxQueued=8, workers=2):
+        self._queue = queue.Queue(maxsize=maxQueued)
+        self._completed = queue.SimpleQueue() # finished writes waiting for their callbacks
+        self._pending = {} # fpath -> number of queued writes
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name="imageWriter"+str(i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.close)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def submit(self, fpath, image, fcomp=[cv2.IMWRITE_JPEG_QUALITY, 90], callback=None, timeout=None):
+        """Queues an image to be written, waiting for room if the queue is full.
+
+        Parameters
+        ~~~~~~~~~~
+        fpath : str
+            The path to save the image to.
+        image : numpy.ndarray
+            The image to save.
+        fcomp : list, optional
+            The image compression settings.
+        callback : function, optional
+            Called as callback(fpath, result) once the write is done; see
+            dispatchCompleted for which thread it is called from.
+        timeout : float, optional
+            Seconds to wait for room in the queue before raising queue.Full.
+
+        """
+        with self._lock:
+            self._pending[fpath] = self._pending.get(fpath, 0) + 1
+        try:
+            self._queue.put((fpath, image, fcomp, callback), timeout=timeout)
+        except queue.Full:
+            self._donePending(fpath)
+            raise
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def isPending(self, fpath):
+        """Returns True if a write to the given path is queued or in progress."""
+        with self._lock:
+            return fpath in self._pending
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def dispatchCompleted(self):
+        """Runs the callbacks of finished writes in the calling thread.
+
+        Tkinter widgets may only be touched from the GUI thread, so GUIs
+        should call this periodically with after() rather than letting the
+        writer threads run callbacks.
+
+        Returns
+        ~~~~~~~
+        count : int
+            The number of callbacks run.
+
+        """
+        count = 0
+        while True:
+            try:
+                callback, fpath, result = self._completed.get_nowait()
+            except queue.Empty:
+                return count
+            callback(fpath, result)
+            count += 1
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def flush(self):
+        """Waits until every queued image has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Writes any queued images and stops the writer threads."""
+        if not self._threads:
+            return
+        self.flush()
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            fpath, image, fcomp, callback = job
+            try:
+                result = cv2.imwrite(fpath, image, fcomp)
+            except Exception as error:
+                print("Failed to write {}: {}".format(fpath, error))
+                result = False
+            self._donePending(fpath)
+            if callback is not None:
+                self._completed.put((callback, fpath, result))
+            self._queue.task_done()
+
+    def _donePending(self, fpath):
+        with self._lock:
+            self._pending[fpath] -= 1
+            if not self._pending[fpath]:
+                del self._pending[fpath]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+_defaultWriter = None
+_defaultLock = threading.Lock()
+
+def getImageWriter():
+    """Returns the image writer shared by the whole program."""
+    global _defaultWriter
+    with _defaultLock:
+        if _defaultWriter is None:
+            _defaultWriter = imageWriter()
+        return _defaultWriter
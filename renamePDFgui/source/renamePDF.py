@@ -2,7 +2,9 @@
 """ PDF Renamer
 
 This script renames PDF scans of data sheets to the proper name format.
-The given files will be renamed in their original location.
+The given files will be renamed in their original location. When renaming
+a folder of PDFs, the titles are extracted across a pool of worker
+processes.
 
 Author: Dimitri Mojsejenko
 """
@@ -11,58 +13,229 @@ import os
 import sys
 import argparse
 import glob
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from titleIndex import lookupTitle, CODE_PREFIX
 
-def extract_title(pdf_path):
+HEADER_FRACTION = 0.25 # the share of the page from the top where the test code is
+
+# operators that show text, for finding where on the page each piece of text is
+TEXT_OPERATORS = (b"Tj", b"TJ", b"'", b'"')
+
+class _CodeFound(BaseException):
+    """Raised to stop extracting a page's text once its test code is found.
+    
+    Not an Exception, as PyPDF2 ignores Exceptions raised in parts of its 
+    text extraction.
+    """
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _findCode(text):
+    """Returns the test code following APO-TC- in the text, or empty string if there isn't one."""
+    for word in text.split():
+        word = word.strip(',')
+        if word[0:7] == CODE_PREFIX and len(word) > 7:
+            return word[7::]
+    return ''
+
+def extract_test_code(page, header_fraction=HEADER_FRACTION):
+    """Given the first page of a PDF, returns its test code and how it was found
+    
+    The text at the top of the page is checked as it is extracted, and 
+    extraction stops as soon as the test code is found there, so the rest of 
+    the page isn't processed. If it isn't there, the first couple lines of 
+    the full page text are checked instead.
+    
+    Parameters
+    ~~~~~~~~~~
+    page : PyPDF2.PageObject
+        The first page of the PDF
+    header_fraction : float, optional
+        The share of the page height, from the top, to look for the code in
+        
+    Returns
+    ~~~~~~~
+    testNum : str
+        The test code without the APO-TC- prefix, or empty string if not found
+    method : str
+        "from header" or "from full page" depending on where it was found, 
+        or empty string if not found
+    
+    """
+    box = page.mediabox
+    headerBottom = float(box.top) - float(box.height) * header_fraction
+    rotated = page.get("/Rotate", 0) % 360 != 0 # the top of the page isn't the top of its text
+    header = []
+    shownAt = [] # heights of the text shown since the last piece was passed to visitor
+    showing = [False] # whether the operator being processed shows text
+
+    def before(operator, operands, cm, tm):
+        showing[0] = operator in TEXT_OPERATORS
+        if showing[0]:
+            shownAt.append(tm[4] * cm[1] + tm[5] * cm[3] + cm[5])
+
+    def visitor(text, cm, tm, fontDict, fontSize):
+        # text is passed on at line breaks, while the next text is being shown
+        # after the position has moved on, so its height is taken from where
+        # the text before that was shown
+        if showing[0] and len(shownAt) > 1:
+            y = max(shownAt[:-1])
+            del shownAt[:-1]
+        elif shownAt:
+            y = max(shownAt)
+            shownAt.clear()
+        else:
+            return
+        if rotated or not text.strip():
+            return
+        if y >= headerBottom:
+            header.append(text)
+            testNum = _findCode(" ".join(header[-2:]))
+            if testNum:
+                raise _CodeFound(testNum)
+
+    try:
+        page_text = page.extract_text(visitor_operand_before=before, visitor_text=visitor)
+    except _CodeFound as found:
+        return found.args[0], "from header"
+    # grab the first couple lines of the page text where test code should be
+    testNum = ''
+    lines = page_text.split('\n')
+    for line in lines[0:2]:
+        testNum = _findCode(line) or testNum
+    return testNum, ("from full page" if testNum else '')
+
+def extract_title(pdf_path, titleFiles=None):
     """Given a path to a PDF, returns the title corresponding to the PDF test code
     
     Parameters
     ~~~~~~~~~~
     pdf_path : str
         The path of the PDF to rename
+    titleFiles : list, optional
+        The title files to look the test code up in; defaults to 
+        dataSheetTitles.txt
+        
+    Returns
+    ~~~~~~~
+    title : str
+        The title of the test case in the PDF, or empty string if not found
+    
+    """
+    return extract_test_info(pdf_path, titleFiles)[1]
+
+def extract_test_info(pdf_path, titleFiles=None):
+    """Given a path to a PDF, returns the PDF test code and its corresponding title
+    
+    Parameters
+    ~~~~~~~~~~
+    pdf_path : str
+        The path of the PDF to rename
+    titleFiles : list, optional
+        The title files to look the test code up in; defaults to 
+        dataSheetTitles.txt
         
     Returns
     ~~~~~~~
+    testNum : str
+        The test code in the PDF without the APO-TC- prefix, or empty string 
+        if not found
     title : str
         The title of the test case in the PDF, or empty string if not found
     
     """
-    # text file of data sheet titles with corresponding test code
-    titles_txt = 'dataSheetTitles.txt'
-    with open(pdf_path, 'rb') as f, open(titles_txt, 'r') as titles:
+    testNum, title, messages = _readTestInfo(pdf_path, titleFiles)
+    for line in messages:
+        print(line)
+    return testNum, title
+
+def _readTestInfo(pdf_path, titleFiles=None):
+    """Returns the test code and title of a PDF, and the lines saying how the code was found, without printing them."""
+    with open(pdf_path, 'rb') as f:
         pdf = PdfReader(f)
-        pdf_info = pdf.metadata
         page = pdf.pages[0]
-        print("PDF path: ", pdf_path)
+        messages = ["PDF path:  {}".format(pdf_path)]
         
         # Extract test code from page
-        page_text = page.extract_text()
-        testNum = ''
-        try:
-            # grab the first couple lines of the page text where test code should be
-            lines = page_text.split('\n')
-            firstLines = lines[0:2]
-            for line in firstLines:
-                words = line.split(' ')
-                for word in words:
-                    word = word.strip(',')
-                    try:
-                        if word[0:7] == "APO-TC-":
-                            testNum = word[7::]
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+        testNum, method = extract_test_code(page)
 
         # Find corresponding title for test code
         title = ''
         if testNum:
-            print("Test code extracted from PDF: APO-TC-", testNum)
-            for line in titles:
-                if testNum in line:
-                    title = line.split(';')[1].strip()
+            messages.append("Test code extracted from PDF {}: APO-TC- {}".format(method, testNum))
+            title = lookupTitle(testNum, titleFiles)
         else:
-            print("Error: could not extract test code from PDF.")
-        return title
+            messages.append("Error: could not extract test code from PDF.")
+        return testNum, title, messages
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _extractRecord(pdf_path, titleFiles=None):
+    """Returns the path, test code, title and messages of one PDF, with empty code and title if it can't be read.
+
+    Nothing is printed here, as this runs in worker processes; the messages
+    are printed by the progress callback in the main process instead.
+    """
+    try:
+        testNum, title, messages = _readTestInfo(pdf_path, titleFiles)
+    except Exception as error:
+        # one unreadable PDF shouldn't stop the rest of the folder
+        testNum, title = '', ''
+        messages = ["Error: could not read {}: {}".format(pdf_path, error)]
+    return pdf_path, testNum, title, messages
+
+def extract_titles(pdf_paths, workers=None, progress=None, titleFiles=None):
+    """Given paths to PDFs, returns the test code and title of each, extracted in parallel
+    
+    Parameters
+    ~~~~~~~~~~
+    pdf_paths : list
+        The paths of the PDFs to rename
+    workers : int, optional
+        The number of worker processes; defaults to the number of CPUs. 
+        With 1 worker the PDFs are read in this process.
+    progress : function, optional
+        Called as progress(done, total, record) as each PDF is read, in 
+        this process; printProgress prints each record and its messages
+    titleFiles : list, optional
+        The title files to look the test codes up in; defaults to 
+        dataSheetTitles.txt
+        
+    Returns
+    ~~~~~~~
+    records : list
+        A (path, test code, title, messages) tuple per PDF, in the order 
+        given; the code and title are empty strings if not found, and 
+        messages are the lines saying how the code was found or why not
+    
+    """
+    pdf_paths = list(pdf_paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pdf_paths)))
+    records = [None] * len(pdf_paths)
+    done = 0
+    if workers == 1:
+        for i, pdf_path in enumerate(pdf_paths):
+            records[i] = _extractRecord(pdf_path, titleFiles)
+            done += 1
+            if progress is not None:
+                progress(done, len(pdf_paths), records[i])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_extractRecord, pdf_path, titleFiles): i for i, pdf_path in enumerate(pdf_paths)}
+            for future in as_completed(futures):
+                records[futures[future]] = future.result()
+                done += 1
+                if progress is not None:
+                    progress(done, len(pdf_paths), records[futures[future]])
+    return records
+
+def printProgress(done, total, record):
+    """Prints the title found for each PDF as it is read, after the messages from reading it."""
+    pdf_path, testNum, title, messages = record
+    for line in messages:
+        print(line)
+    print("[{}/{}] {}: {}".format(done, total, pdf_path, title if title else "no title found"))
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def renamePDF(pdf_path, title, lifeNum=''):
@@ -102,6 +275,16 @@ def main():
         type=int,
         help="The test life number to rename the PDF with"
     )
+    argParser.add_argument(
+        "-j", "--workers",
+        type=int,
+        help="The number of PDFs to read at once when renaming a folder (default: number of CPUs)"
+    )
+    argParser.add_argument(
+        "--titles",
+        nargs='+',
+        help="The title files to look test codes up in, later files taking precedence (default: dataSheetTitles.txt)"
+    )
     args = argParser.parse_args()
     
     # Check if PDFpath is a single PDF or folder of PDFs
@@ -118,17 +301,17 @@ def main():
         if choice == 'n':
             sys.exit("Quitting script")
         else:
-            for f in pdfList:
-                newTitle = extract_title(f)
+            for f, testNum, newTitle, messages in extract_titles(pdfList, args.workers, printProgress, args.titles):
                 if newTitle:
                     print("New title: ", newTitle)
                     renamePDF(f, newTitle, args.lifeNumber)
                     
     else: # single PDF to rename
-        newTitle = extract_title(args.PDFpath)
+        newTitle = extract_title(args.PDFpath, args.titles)
         if newTitle:
             renamePDF(args.PDFpath, newTitle, args.lifeNumber)
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # for worker processes in the Windows executable
     main()
@@ -8,16 +8,22 @@ cases will not be modified.
 Requires:
     * the following files to be in the runpath of renamePDFgui.py:
         * renamePDF.py
+        * titleIndex.py
         * dataSheetTitles.txt
 Author: Dimitri Mojsejenko
 """
 
 import os
-import subprocess
+import sys
 import glob
+import multiprocessing
 from tkinter import *
 from tkinter.filedialog import askopenfilename
 from renamePDF import *
+from titleIndex import titleTable, TITLES_TXT
+commonPath = os.path.join(os.path.dirname(__file__), '..', '..', 'common')
+sys.path.append(commonPath)
+from userPaths import downloadsFolder
 
 def _renamePDF():
     # Check that given life number is an integer
@@ -47,71 +53,84 @@ def _gatherVars():
     newTitle = []
     if len(pdf_path) > 1:
         pdf_path = list(pdf_path.strip('}{').split('} {'))
-        for f in pdf_path:
-            newTitle.append(extract_title(f))
+        # read the PDFs in parallel, showing progress as each is read
+        newTitle = [title for f, testNum, title, messages in extract_titles(pdf_path, progress=_showProgress)]
     else:
         newTitle = extract_title(pdf_path)
     return [pdf_path, newTitle, lifeNum]
 
+def _showProgress(done, total, record):
+    """Shows how many PDFs have been read so far"""
+    printProgress(done, total, record)
+    message.configure(text="Reading PDFs... {}/{}".format(done, total))
+    root.update_idletasks()
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def _chooseFile(tkEntry):
     """Opens user dialogue asking for file, and stores name of file into given Tkinter entry"""
-    # get the current user profile to start file dialogue at user's Downloads folder
-    user = subprocess.run(['cmd.exe', '/c', 'echo %USERNAME%'], stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-    downloads = "/mnt/c/Users/"+user+"/Downloads/"
+    # start file dialogue at user's Downloads folder
+    downloads = downloadsFolder()
     fname = askopenfilename(filetypes=[("PDF", ".pdf")], initialdir=downloads, title="Select PDF(s)", multiple=True)
     tkEntry.delete(0,END)
     tkEntry.insert(0,fname)
         
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-# Main GUI loop
+# Main GUI loop, only when run (worker processes import this module too)
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support() # for worker processes in the Windows executable
+    # create Tkinter GUI
+    root = Tk()
+    # get screen width and height
+    #  - 1280x720 for laptop
+    ws = root.winfo_screenwidth()
+    hs = root.winfo_screenheight()
+    # set GUI window width and height
+    w = 600
+    h = 250
+    # set GUI window location to center of screen
+    x = (ws/2) - (w/2)
+    y = (hs/2) - (h/2)
+    root.geometry('%dx%d+%d+%d' % (w, h, x, y)) # (<width>x<height>+<x>+<y>)
+    root.title("PDF Renamer GUI")
 
-# create Tkinter GUI
-root = Tk()
-# get screen width and height
-#  - 1280x720 for laptop
-ws = root.winfo_screenwidth()
-hs = root.winfo_screenheight()
-# set GUI window width and height
-w = 600
-h = 250
-# set GUI window location to center of screen
-x = (ws/2) - (w/2)
-y = (hs/2) - (h/2)
-root.geometry('%dx%d+%d+%d' % (w, h, x, y)) # (<width>x<height>+<x>+<y>)
-root.title("PDF Renamer GUI")
+    # first row
+    row1 = Frame(root)
+    lab1 = Label(row1, width=18, text="Select PDF(s) to rename:")
+    lab1.pack(pady=5)
+    row1.pack(side=TOP, fill=X, padx=5, pady=5)
 
-# first row
-row1 = Frame(root)
-lab1 = Label(row1, width=18, text="Select PDF(s) to rename:")
-lab1.pack(pady=5)
-row1.pack(side=TOP, fill=X, padx=5, pady=5)
+    # second row
+    row2 = Frame(root)
+    inFile = Entry(row2)
+    fileBut = Button(row2, text="Choose File(s)", anchor='e')
+    fileBut.bind('<Button>', lambda fButHandler: _chooseFile(inFile))
+    inFile.pack(side=LEFT, expand=YES, fill=X)
+    fileBut.pack(side=RIGHT)
+    row2.pack(side=TOP, fill=X, padx=5, pady=5)
 
-# second row
-row2 = Frame(root)
-inFile = Entry(row2)
-fileBut = Button(row2, text="Choose File(s)", anchor='e')
-fileBut.bind('<Button>', lambda fButHandler: _chooseFile(inFile))
-inFile.pack(side=LEFT, expand=YES, fill=X)
-fileBut.pack(side=RIGHT)
-row2.pack(side=TOP, fill=X, padx=5, pady=5)
+    # third row
+    row3 = Frame(root)
+    lab3 = Label(row3, text="Test Life Number")
+    #TODO: look into tkinter entry validation
+    lifeNumEnt = Entry(row3, width=5)
+    lifeNumEnt.pack(padx=5)
+    lab3.pack()
+    row3.pack(side=TOP, fill=X, padx=5, pady=5)
 
-# third row
-row3 = Frame(root)
-lab3 = Label(row3, text="Test Life Number")
-#TODO: look into tkinter entry validation
-lifeNumEnt = Entry(row3, width=5)
-lifeNumEnt.pack(padx=5)
-lab3.pack()
-row3.pack(side=TOP, fill=X, padx=5, pady=5)
+    # rename PDF
+    mainBut = Button(root, text="Rename PDF(s)", anchor='n')
+    mainBut.bind('<Button>', lambda mainButHandler: _renamePDF())
+    mainBut.pack(side=TOP, padx=5, pady=5)
 
-# rename PDF
-mainBut = Button(root, text="Rename PDF(s)", anchor='n')
-mainBut.bind('<Button>', lambda mainButHandler: _renamePDF())
-mainBut.pack(side=TOP, padx=5, pady=5)
+    # message
+    message = Label(root, text="")
+    message.pack(side=BOTTOM, padx=5, pady=10)
 
-# message
-message = Label(root, text="")
-message.pack(side=BOTTOM, padx=5, pady=10)
+    # read the titles now, so a missing title file is shown before any PDFs are chosen
+    try:
+        titleTable()
+    except OSError:
+        message.configure(text="{} not found. PDFs can't be renamed without it.".format(TITLES_TXT))
 
-root.mainloop()
\ No newline at end of file
+    root.mainloop()
\ No newline at end of file
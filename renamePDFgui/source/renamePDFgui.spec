@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['renamePDFgui.py'],
-    pathex=[],
+    pathex=['..\\..\\common'],
     binaries=[],
     datas=[('.\\dataSheetTitles.txt','.')],
     hiddenimports=[],
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+""" Data Sheet Title Index
+
+This module looks up the title of a data sheet by its test code. Title
+files hold one test code and title per line, separated by a semicolon:
+    1711; Cleaning Chemical Compatibility
+Each file is read once per process into a dict keyed by the exact test
+code, and read again only when it changes on disk. Several title files
+can be used together, such as an updated list alongside the original;
+where they share a code, the later file's title is used.
+
+Author: Dimitri Mojsejenko
+"""
+import os
+
+# text file of data sheet titles with corresponding test code
+TITLES_TXT = 'dataSheetTitles.txt'
+CODE_PREFIX = "APO-TC-"
+
+_titleFiles = {} # path -> ((modification time, size), {test code: title})
+_merged = {} # tuple of paths -> (their versions, merged {test code: title})
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def normalizeCode(testNum):
+    """Returns a test code without its APO-TC- prefix or surrounding space and punctuation."""
+    testNum = testNum.strip().strip(',;:.')
+    if testNum.upper().startswith(CODE_PREFIX):
+        testNum = testNum[len(CODE_PREFIX):]
+    return testNum
+
+def parseTitles(titles_txt):
+    """Returns the titles in a title file as a dict keyed by test code."""
+    titles = {}
+    with open(titles_txt, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            code, sep, title = line.partition(';')
+            if not sep or not code.strip():
+                continue
+            titles[normalizeCode(code)] = title.strip()
+    return titles
+
+def loadTitles(titles_txt=TITLES_TXT):
+    """Returns the titles in a title file, reading it only if it changed since it was last read."""
+    stat = os.stat(titles_txt)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _titleFiles.get(titles_txt)
+    if cached is None or cached[0] != version:
+        cached = (version, parseTitles(titles_txt))
+        _titleFiles[titles_txt] = cached
+    return cached[1]
+
+def titleTable(titleFiles=None):
+    """Returns the titles of the given title files merged, with later files taking precedence."""
+    if titleFiles is None:
+        titleFiles = [TITLES_TXT]
+    elif isinstance(titleFiles, str):
+        titleFiles = [titleFiles]
+    if len(titleFiles) == 1:
+        return loadTitles(titleFiles[0])
+    tables = [loadTitles(titles_txt) for titles_txt in titleFiles]
+    key = tuple(titleFiles)
+    versions = tuple(_titleFiles[titles_txt][0] for titles_txt in titleFiles)
+    cached = _merged.get(key)
+    if cached is None or cached[0] != versions:
+        titles = {}
+        for table in tables:
+            titles.update(table)
+        cached = (versions, titles)
+        _merged[key] = cached
+    return cached[1]
+
+def lookupTitle(testNum, titleFiles=None):
+    """Returns the title for a test code, or empty string if it isn't in the title files.
+
+    Parameters
+    ~~~~~~~~~~
+    testNum : str
+        The test code, with or without the APO-TC- prefix.
+    titleFiles : list or str, optional
+        The title files to look in; defaults to dataSheetTitles.txt.
+
+    """
+    return titleTable(titleFiles).get(normalizeCode(testNum), '')